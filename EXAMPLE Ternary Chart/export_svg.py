@@ -1,5 +1,11 @@
 import json
 import math
+import os
+import sys
+
+# Same projection as the web app and the build (ternary_geometry.py in the repo root)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ternary_geometry import unit_xy
 
 def main():
     # Dimensions - High resolution
@@ -33,13 +39,9 @@ def main():
     def ternary_to_cartesian(e, f, b):
         total = e + f + b
         if total == 0: return {'x': 0, 'y': 0}
-        E = e / total
-        F = f / total
-        B = b / total
-        
-        x = v_ele['x'] * E + v_fos['x'] * F + v_bio['x'] * B
-        y = v_ele['y'] * E + v_fos['y'] * F + v_bio['y'] * B
-        return {'x': x, 'y': y}
+        # Unit triangle point scaled to this triangle, whose Bio corner is at v_bio
+        u, v = unit_xy(b / total, e / total, f / total)
+        return {'x': v_bio['x'] + side * u, 'y': v_bio['y'] + side * v}
 
     # Load data
     with open('combined_energy_data.json', 'r') as f:
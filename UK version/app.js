@@ -39,6 +39,7 @@ let playInterval = null;
 let playSpeed = 1;
 let energyMode = 'final';
 let isSmoothed = false;
+let TRAIL_LOD = null; // Simplified trails (uk_global_merged.lod.json from `python -m ternary lod`), if present
 
 // Chart dimensions
 const width = 800;
@@ -69,6 +70,25 @@ const svg = d3.select('#viz-container').append('svg')
     .append('g')
     .attr('transform', `translate(${margin.left},${margin.top})`);
 
+// Trail level of detail: the coarsest simplification whose error stays under this on screen
+const LOD_MAX_ERROR_PX = 1;
+
+function lodLevel(tolerances) {
+    const root = svg.node().ownerSVGElement.getBoundingClientRect();
+    const scale = Math.min(root.width / width, root.height / height) * innerWidth; // Screen pixels per triangle side
+    let level = -1;
+    tolerances.forEach((tol, i) => { if (tol * scale <= LOD_MAX_ERROR_PX) level = i; });
+    return level;
+}
+
+function lodKeptYears(country) {
+    // Years of the trail points kept at the chosen level, or null to draw every point
+    const trails = TRAIL_LOD && TRAIL_LOD.regions[country] && TRAIL_LOD.regions[country][energyMode];
+    if (!trails) return null;
+    const level = lodLevel(TRAIL_LOD.tolerances);
+    return level < 0 ? null : new Set(trails[isSmoothed ? 'smooth' : 'trail'][level]);
+}
+
 // Highlight functions for axis interactivity
 function highlightAxis(axisType) {
     svg.selectAll(`.grid-line.${axisType}-grid`).classed('highlighted', true);
@@ -415,7 +435,7 @@ function updateChart() {
     const trailGroup = svg.append('g').attr('class', 'trail-group');
 
     selectedCountries.forEach(country => {
-        const pathData = [];
+        let pathData = [];
         const years = Object.keys(RAW_DATA[country] || {}).map(y => parseInt(y)).sort((a, b) => a - b);
 
         let rawPoints = [];
@@ -450,10 +470,18 @@ function updateChart() {
                     finalFoss = d3.mean(subset, d => d.foss);
                 }
 
-                pathData.push(ternToXY(finalBio, finalElec, finalFoss));
+                pathData.push({ ...ternToXY(finalBio, finalElec, finalFoss), year: y });
             }
         });
 
+        // Simplified trail: the kept points, then every point after the last of them
+        const kept = lodKeptYears(country);
+        if (kept) {
+            let lastKept = -1;
+            pathData.forEach((p, k) => { if (kept.has(p.year)) lastKept = k; });
+            pathData = pathData.filter((p, k) => kept.has(p.year) || k > lastKept);
+        }
+
         if (pathData.length > 1) {
             const lineGen = d3.line().x(d => d.x).y(d => d.y).curve(d3.curveBundle.beta(1));
             trailGroup.append('path')
@@ -689,6 +717,10 @@ async function init() {
     // Load data
     const response = await fetch('uk_global_merged.json');
     RAW_DATA = await response.json();
+    // Optional: without it every trail point is drawn
+    TRAIL_LOD = await fetch('uk_global_merged.lod.json')
+        .then(r => r.ok ? r.json() : null)
+        .catch(() => null);
 
     // Setup UI
     const slider = document.getElementById('year-slider');
@@ -32,6 +32,9 @@ const COUNTRY_CONFIG = { ...REGIONS_CONFIG, ...COUNTRIES_CONFIG };
 
 // State
 let RAW_DATA = {};
+let DATA_INDEX = null; // data.index.json when the data is split into per-region shards
+const shardRequests = {};
+const GEOMETRY = {}; // Region -> mode -> trail geometry (from the packed data or built from RAW_DATA)
 let selectedCountries = new Set(['United States', 'China', 'Germany', 'India', 'Brazil', 'World', 'Europe']);
 let currentYear = 2023;
 let isPlaying = false;
@@ -60,6 +63,83 @@ function ternToXY(bio, elec, foss) {
     return { x: xPos, y: yPos };
 }
 
+// Trail geometry, as precomputed by the build (ternary_geometry.py): points in the
+// unit triangle (scaled by innerWidth here), the trail of the years with a record
+// and, per year, how many trail points are drawn up to it
+const CORNER_CATS = { final: ['bio', 'electrons', 'fossil'], useful: ['bio', 'electrons', 'fossil'], power: ['other', 'wind_solar', 'fossil'] };
+const SMOOTH_WINDOW = 5;
+const POWER_TRAIL_START = 1985;
+const LOD_MAX_ERROR_PX = 1; // Simplified trails are used while they stay this close to the full ones on screen
+
+function smoothTrail(trail) {
+    // Trailing mean of every point with up to SMOOTH_WINDOW - 1 points before it
+    const n = trail.length / 2;
+    const smooth = new Float32Array(trail.length);
+    for (let k = 0; k < n; k++) {
+        const start = Math.max(0, k - SMOOTH_WINDOW + 1);
+        let x = 0, y = 0;
+        for (let j = start; j <= k; j++) { x += trail[2 * j]; y += trail[2 * j + 1]; }
+        smooth[2 * k] = x / (k - start + 1);
+        smooth[2 * k + 1] = y / (k - start + 1);
+    }
+    return smooth;
+}
+
+function buildGeometry(countryData) {
+    // Same geometry from data.json records, for when the packed data is not available
+    const years = Object.keys(countryData).map(Number).sort((a, b) => a - b);
+    const geometry = {};
+    if (!years.length) return geometry;
+    const firstYear = years[0];
+    const n = years[years.length - 1] - firstYear + 1;
+    Object.entries(CORNER_CATS).forEach(([mode, cats]) => {
+        const trail = [], trailYears = [], trailEnd = new Uint16Array(n);
+        years.forEach(y => {
+            const d = countryData[y][mode];
+            if (!d || !d.source) return;
+            const p = ternToXY(...cats.map(c => (d[c + '_pct'] || 0) / 100));
+            trail.push(p.x / innerWidth, p.y / innerWidth);
+            trailYears.push(y);
+        });
+        let k = 0;
+        for (let i = 0; i < n; i++) {
+            while (k < trailYears.length && trailYears[k] <= firstYear + i) k++;
+            trailEnd[i] = k;
+        }
+        geometry[mode] = {
+            firstYear, trailEnd, trailYears, cornerCats: cats, lod: [], lodTolerances: [],
+            trail: Float32Array.from(trail),
+            smooth: smoothTrail(trail),
+            trailStart: mode === 'power' ? trailYears.filter(y => y < POWER_TRAIL_START).length : 0
+        };
+    });
+    return geometry;
+}
+
+function lodLevel(tolerances) {
+    // Coarsest simplification level whose tolerance is under LOD_MAX_ERROR_PX at the chart's size, or -1
+    const root = svg.node().ownerSVGElement.getBoundingClientRect();
+    const scale = Math.min(root.width / width, root.height / height) * innerWidth; // Screen pixels per triangle side
+    let level = -1;
+    tolerances.forEach((tol, i) => { if (tol * scale <= LOD_MAX_ERROR_PX) level = i; });
+    return level;
+}
+
+function trailIndices(g, end) {
+    // Trail points drawn up to point `end`: all of them, or the ones a simplification
+    // level keeps before `end` followed by every point after the last of those
+    const level = g.lod.length ? lodLevel(g.lodTolerances) : -1;
+    if (level < 0) return d3.range(g.trailStart, end);
+    const kept = g.lod[level][isSmoothed ? 'smooth' : 'trail'];
+    const n = d3.bisectLeft(kept, end);
+    return Array.from(kept.subarray(0, n)).concat(d3.range(kept[n - 1] + 1, end));
+}
+
+function regionGeometry(country) {
+    if (!GEOMETRY[country] && RAW_DATA[country]) GEOMETRY[country] = buildGeometry(RAW_DATA[country]);
+    return GEOMETRY[country];
+}
+
 // Create SVG
 const svg = d3.select('#viz-container').append('svg')
     .attr('viewBox', `0 0 ${width} ${height}`)
@@ -372,92 +452,39 @@ function drawTriangle() {
 
 function updateChart() {
     const currentData = [];
-    selectedCountries.forEach(country => {
-        const countryData = RAW_DATA[country];
-        if (countryData) {
-            const years = Object.keys(countryData).map(Number).sort((a, b) => a - b);
-            let displayYear = null;
-            for (let y of years) {
-                if (y <= currentYear) displayYear = y;
-                else break;
-            }
 
-            if (displayYear !== null) {
-                const d = countryData[displayYear][energyMode];
-                if (d) {
-                    let bio, elec, foss, absolute;
-                    if (energyMode === 'power') {
-                        bio = (d.other_pct || 0) / 100;
-                        elec = (d.wind_solar_pct || 0) / 100;
-                        foss = (d.fossil_pct || 0) / 100;
-                        absolute = d.total;
-                    } else {
-                        bio = (d.bio_pct || 0) / 100;
-                        elec = (d.electrons_pct || 0) / 100;
-                        foss = (d.fossil_pct || 0) / 100;
-                        absolute = d.total;
-                    }
-
-                    currentData.push({
-                        country,
-                        year: displayYear,
-                        bio, elec, foss,
-                        source: d.source,
-                        absolute
-                    });
-                }
-            }
-        }
-    });
-
-    // Trails
+    // Trails: a slice of the precomputed trail up to the current year
     svg.selectAll('.trail-group').remove();
     const trailGroup = svg.append('g').attr('class', 'trail-group');
 
     selectedCountries.forEach(country => {
-        const pathData = [];
-        const years = Object.keys(RAW_DATA[country] || {}).map(y => parseInt(y)).sort((a, b) => a - b);
-
-        let rawPoints = [];
-        years.forEach(y => {
-            const d = RAW_DATA[country][y][energyMode];
-            if (d) {
-                let bio, elec, foss;
-                if (energyMode === 'power') {
-                    bio = d.other_pct / 100;
-                    elec = d.wind_solar_pct / 100;
-                    foss = d.fossil_pct / 100;
-                } else {
-                    bio = d.bio_pct / 100;
-                    elec = d.electrons_pct / 100;
-                    foss = d.fossil_pct / 100;
-                }
-                rawPoints.push({ y, bio, elec, foss });
-            }
-        });
-
-        rawPoints.forEach((pt, i) => {
-            const y = pt.y;
-            if (energyMode === 'power' && y < 1985) return;
-            if (y <= currentYear) {
-                let finalBio = pt.bio, finalElec = pt.elec, finalFoss = pt.foss;
-
-                if (isSmoothed) {
-                    let start = Math.max(0, i - 4);
-                    let subset = rawPoints.slice(start, i + 1);
-                    finalBio = d3.mean(subset, d => d.bio);
-                    finalElec = d3.mean(subset, d => d.elec);
-                    finalFoss = d3.mean(subset, d => d.foss);
-                }
-
-                pathData.push(ternToXY(finalBio, finalElec, finalFoss));
-            }
+        const geometry = regionGeometry(country);
+        const g = geometry && geometry[energyMode];
+        if (!g) return;
+        const yearIdx = Math.min(currentYear - g.firstYear, g.trailEnd.length - 1);
+        const end = yearIdx >= 0 ? g.trailEnd[yearIdx] : 0;
+        if (end === 0) return;
+
+        // Current point: the latest year up to currentYear with a record
+        const year = g.trailYears[end - 1];
+        const d = RAW_DATA[country][year][energyMode];
+        const [bio, elec, foss] = g.cornerCats.map(c => (d[c + '_pct'] || 0) / 100);
+        currentData.push({
+            country, year, bio, elec, foss,
+            x: g.trail[2 * (end - 1)] * innerWidth,
+            y: g.trail[2 * (end - 1) + 1] * innerWidth,
+            source: d.source,
+            absolute: d.total
         });
 
-        if (pathData.length > 1) {
-            const lineGen = d3.line().x(d => d.x).y(d => d.y).curve(d3.curveBundle.beta(1));
+        const points = isSmoothed ? g.smooth : g.trail;
+        if (end - g.trailStart > 1) {
+            const lineGen = d3.line()
+                .x(k => points[2 * k] * innerWidth)
+                .y(k => points[2 * k + 1] * innerWidth)
+                .curve(d3.curveBundle.beta(1));
             trailGroup.append('path')
-                .attr('d', lineGen(pathData))
+                .attr('d', lineGen(trailIndices(g, end)))
                 .attr('class', 'year-trail')
                 .attr('stroke', COUNTRY_CONFIG[country].color)
                 .attr('fill', 'none');
@@ -476,8 +503,8 @@ function updateChart() {
         .style('cursor', 'pointer');
 
     points.merge(enter)
-        .attr('cx', d => ternToXY(d.bio, d.elec, d.foss).x)
-        .attr('cy', d => ternToXY(d.bio, d.elec, d.foss).y)
+        .attr('cx', d => d.x)
+        .attr('cy', d => d.y)
         .attr('fill', d => COUNTRY_CONFIG[d.country].color)
         .on('mouseover', function (event, d) {
             const tooltip = d3.select('#tooltip');
@@ -601,7 +628,10 @@ function renderList() {
         `;
         item.onclick = () => {
             if (selectedCountries.has(region)) selectedCountries.delete(region);
-            else selectedCountries.add(region);
+            else {
+                selectedCountries.add(region);
+                loadRegion(region).then(updateChart);
+            }
             renderList(); updateChart(); renderLegend();
         };
         regionsContainer.appendChild(item);
@@ -618,7 +648,10 @@ function renderList() {
         `;
         item.onclick = () => {
             if (selectedCountries.has(country)) selectedCountries.delete(country);
-            else selectedCountries.add(country);
+            else {
+                selectedCountries.add(country);
+                loadRegion(country).then(updateChart);
+            }
             renderList(); updateChart(); renderLegend();
         };
         countriesContainer.appendChild(item);
@@ -658,7 +691,10 @@ function renderLegend() {
 
 function toggleAll() {
     if (selectedCountries.size === Object.keys(COUNTRY_CONFIG).length) selectedCountries.clear();
-    else selectedCountries = new Set(Object.keys(COUNTRY_CONFIG));
+    else {
+        selectedCountries = new Set(Object.keys(COUNTRY_CONFIG));
+        loadSelectedRegions().then(updateChart);
+    }
     renderList(); updateChart(); renderLegend();
 }
 
@@ -684,11 +720,133 @@ function setSpeed(speed) {
     }
 }
 
+// Packed data (written by packed_data.py): decode one region block into the data.json shape.
+// base is the byte offset of the block in buffer (0 for a shard)
+function decodeRegion(manifest, buffer, region, base = 0) {
+    const block = manifest.regions[region];
+    const n = block.years;
+    const modes = Object.keys(manifest.modes);
+    const arrays = {};
+    modes.forEach(mode => {
+        const spec = manifest.modes[mode];
+        const at = block.modes[mode];
+        const PctArray = spec.pct_type === 'uint16' ? Uint16Array : Float32Array;
+        arrays[mode] = {
+            values: new Float32Array(buffer, base + at.values, n * spec.values.length),
+            pcts: new PctArray(buffer, base + at.pcts, n * spec.pcts.length),
+            sources: new Uint8Array(buffer, base + at.sources, n)
+        };
+    });
+
+    const result = {};
+    for (let i = 0; i < n; i++) {
+        const entry = {};
+        modes.forEach(mode => {
+            const spec = manifest.modes[mode];
+            const a = arrays[mode];
+            if (a.sources[i] === 255) { entry[mode] = {}; return; }
+            const rec = {};
+            spec.values.forEach((field, j) => { rec[field] = a.values[i * spec.values.length + j]; });
+            spec.pcts.forEach((field, j) => {
+                const v = a.pcts[i * spec.pcts.length + j];
+                if (spec.pct_type === 'uint16') rec[field] = v === 65535 ? null : v / 100;
+                else rec[field] = v;
+            });
+            rec.source = manifest.sources[a.sources[i]];
+            entry[mode] = rec;
+        });
+        if (modes.some(mode => entry[mode].source)) result[block.first_year + i] = entry;
+    }
+    return result;
+}
+
+function decodeGeometry(manifest, buffer, region, base = 0) {
+    // Trail geometry per mode from the packed data
+    const block = manifest.regions[region];
+    const n = block.years;
+    const geometry = {};
+    Object.keys(manifest.modes).forEach(mode => {
+        const at = block.modes[mode];
+        const xy = new Float32Array(buffer, base + at.xy, n * 2);
+        const trailYears = [];
+        for (let i = 0; i < n; i++) if (!isNaN(xy[2 * i])) trailYears.push(block.first_year + i);
+        geometry[mode] = {
+            firstYear: block.first_year,
+            trail: new Float32Array(buffer, base + at.trail, at.points * 2),
+            smooth: new Float32Array(buffer, base + at.smooth, at.points * 2),
+            trailEnd: new Uint16Array(buffer, base + at.trail_end, n),
+            trailStart: at.trail_start,
+            trailYears,
+            cornerCats: manifest.geometry.corner_cats[mode],
+            lod: (at.lod || []).map(level => ({
+                trail: new Uint16Array(buffer, base + level.trail, level.trail_points),
+                smooth: new Uint16Array(buffer, base + level.smooth, level.smooth_points)
+            })),
+            lodTolerances: manifest.geometry.lod_tolerances || []
+        };
+    });
+    return geometry;
+}
+
+async function loadData() {
+    // Prefer the compact typed-array files, fall back to data.json
+    try {
+        const manifestResponse = await fetch('data.manifest.json');
+        if (!manifestResponse.ok) throw new Error(manifestResponse.statusText);
+        const manifest = await manifestResponse.json();
+        const bufferResponse = await fetch(manifest.file);
+        if (!bufferResponse.ok) throw new Error(bufferResponse.statusText);
+        const buffer = await bufferResponse.arrayBuffer();
+        const data = {};
+        Object.keys(manifest.regions).forEach(region => {
+            data[region] = decodeRegion(manifest, buffer, region, manifest.regions[region].offset);
+            GEOMETRY[region] = decodeGeometry(manifest, buffer, region, manifest.regions[region].offset);
+        });
+        return data;
+    } catch (e) {
+        const response = await fetch('data.json');
+        return response.json();
+    }
+}
+
+async function loadIndex() {
+    // Index of the per-region shards, or null if they were not generated
+    try {
+        const response = await fetch('data.index.json');
+        return response.ok ? await response.json() : null;
+    } catch (e) {
+        return null;
+    }
+}
+
+function loadRegion(region) {
+    // Fetch a region's shard the first time it is shown; RAW_DATA keeps it afterwards
+    if (!DATA_INDEX || RAW_DATA[region] || !DATA_INDEX.regions[region]) return Promise.resolve();
+    if (!shardRequests[region]) {
+        shardRequests[region] = fetch(DATA_INDEX.regions[region].file)
+            .then(response => {
+                if (!response.ok) throw new Error(response.statusText);
+                return response.arrayBuffer();
+            })
+            .then(buffer => {
+                RAW_DATA[region] = decodeRegion(DATA_INDEX, buffer, region);
+                GEOMETRY[region] = decodeGeometry(DATA_INDEX, buffer, region);
+            })
+            .catch(() => { delete shardRequests[region]; }); // Retry on the next toggle
+    }
+    return shardRequests[region];
+}
+
+function loadSelectedRegions() {
+    return Promise.all(Array.from(selectedCountries).map(loadRegion));
+}
+
 // Initialize
 async function init() {
-    // Load data
-    const response = await fetch('data.json');
-    RAW_DATA = await response.json();
+    // Load data: with the shard index only the selected regions are fetched up front
+    DATA_INDEX = await loadIndex();
+    if (DATA_INDEX) await loadSelectedRegions();
+    else RAW_DATA = await loadData();
 
     // Setup UI
     const slider = document.getElementById('year-slider');
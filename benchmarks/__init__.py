@@ -0,0 +1,4 @@
+"""
+Benchmarks of the chart pipeline on synthetic inputs (no licensed data needed).
+Run from the repository root: python -m benchmarks [--scales 1 10 100]
+"""
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Time the loaders, the merge and the JSON output on synthetic inputs at several
+scales. Inputs are generated once per scale into --dir and reused. Every timed
+run is appended to --report as a stage_metrics JSON line (run = 'scale=N');
+--baseline compares the best times against an earlier report and exits with 1
+if a benchmark got slower than --tolerance allows.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import generate_all_charts as g
+import stage_metrics
+from benchmarks.synthetic import SEED, write_inputs
+from json_stream import stream_json
+
+SCALES = (1, 10, 100)
+REPEAT = 3
+TOLERANCE = 1.25 # Slowdown against the baseline that counts as a regression
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'ternary-benchmarks')
+
+def merge(raw_iiasa, raw_iea, raw_ember, ember_history):
+    # The merge of generate_all_charts.main for all regions -> (regions, years, columns)
+    stores = (raw_iiasa, raw_iea, raw_ember, ember_history)
+    regions = list(g.REGION_CONFIG)
+    years = g.year_range(raw_iea, raw_ember, ember_history, *raw_iiasa.values())
+    return regions, years, g.region_state.assemble_columns(g.merge_regions(*stores, regions), regions, years, g.MODE_CATS)
+
+def json_output(regions, years, columns, path):
+    with open(path, 'wb') as out:
+        stream_json(g.merged_records(regions, years, columns, g.ORIGINS), [out.write])
+
+def run_scale(scale, directory, repeat, report):
+    paths = write_inputs(os.path.join(directory, f'scale-{scale}'), scale)
+    for setting, path in paths.items():
+        setattr(g, setting, path)
+    g.CACHE_DIR = None # Time the parsers, not the raw cache
+    g.STAGE_REPORT = None # The loaders' own stage records would duplicate ours
+    out_path = os.path.join(directory, f'scale-{scale}', 'data.json')
+
+    benchmarks = [
+        ('load_iea_data', lambda inputs: g.load_iea_data(g.IEA_FILE)),
+        ('load_iiasa_data', lambda inputs: g.load_iiasa_data(g.IIASA_FILE)),
+        ('load_ember_data', lambda inputs: g.load_ember_data(g.EMBER_FILE)),
+        ('load_ember_history', lambda inputs: g.load_ember_history(g.NEW_EMBER_FILE)),
+        ('merge', lambda inputs: merge(inputs['load_iiasa_data'], inputs['load_iea_data'],
+                                       inputs['load_ember_data'], inputs['load_ember_history'])),
+        ('json_output', lambda inputs: json_output(*inputs['merge'], out_path)),
+    ]
+    inputs, best = {}, {}
+    for name, bench in benchmarks:
+        for _ in range(repeat):
+            with stage_metrics.stage(name, report, run=f'scale={scale}') as metrics:
+                inputs[name] = bench(inputs)
+                metrics.info['scale'] = scale
+            wall = metrics.record['wall_s']
+            best[name] = min(best.get(name, wall), wall)
+    return best
+
+def best_times(records):
+    # {(run, stage): best wall time} of report records
+    best = {}
+    for r in records:
+        key = (r['run'], r['stage'])
+        best[key] = min(best.get(key, r['wall_s']), r['wall_s'])
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the chart pipeline on synthetic inputs.')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), help='input size multiples (default 1 10 100)')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help=f'runs per benchmark, the best counts (default {REPEAT})')
+    parser.add_argument('--dir', default=DEFAULT_DIR, help=f'where the synthetic inputs are generated (default {DEFAULT_DIR})')
+    parser.add_argument('--report', help='JSON-lines file to append the runs to (default: benchmarks.jsonl in --dir)')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f'slowdown against the baseline reported as a regression (default {TOLERANCE})')
+    args = parser.parse_args(argv)
+    report = args.report or os.path.join(args.dir, 'benchmarks.jsonl')
+    os.makedirs(args.dir, exist_ok=True)
+
+    results = {}
+    for scale in args.scales:
+        print(f"\n=== Scale {scale}x (seed {SEED}) ===")
+        for name, wall in run_scale(scale, args.dir, args.repeat, report).items():
+            results[(f'scale={scale}', name)] = wall
+
+    baseline = best_times(stage_metrics.read_report(args.baseline)) if args.baseline else {}
+    regressions = []
+    print(f"\n{'run':<12}{'benchmark':<22}{'best s':>10}{'baseline s':>12}{'ratio':>8}")
+    for (run, name), wall in results.items():
+        line = f"{run:<12}{name:<22}{wall:>10.3f}"
+        if (run, name) in baseline:
+            ratio = wall / baseline[(run, name)] if baseline[(run, name)] else float('inf')
+            line += f"{baseline[(run, name)]:>12.3f}{ratio:>8.2f}"
+            if ratio > args.tolerance: regressions.append((run, name, ratio))
+        print(line)
+    print(f"\nAppended all runs to {report}")
+    if regressions:
+        print(f"Slower than {args.tolerance}x the baseline: " + ', '.join(f'{n} ({r}, {x:.2f}x)' for r, n, x in regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
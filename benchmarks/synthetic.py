@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Synthetic stand-ins for the licensed input files, in the same layouts the loaders
+read: the fixed-width WORLDBAL dump, the IIASA CSV, the Ember workbook and the
+extended Ember history CSV.
+Every file holds all the codes REGION_CONFIG references plus filler codes the
+loaders have to skip, like the real files. scale multiplies the filler, so the
+files grow about linearly while the merged output stays the same size.
+The same (scale, seed) always gives the same files.
+"""
+
+import csv
+import os
+import random
+
+import pandas as pd
+
+import generate_all_charts as g
+from worldbal import IEA_FIELD_WIDTH
+
+SEED = 1
+IEA_YEARS = range(1960, 2024)
+IEA_PRODUCTS = ['ELECTRICITY', 'COAL', 'NATURAL_GAS', 'OIL_TOTAL', 'TOTAL', 'RENEWABLES', 'HEAT']
+IEA_FLOWS = ['TFC', 'TES', 'INDPROD']
+IEA_UNITS = ['KTOE', 'TJ']
+IEA_FILLER = 10 # Filler countries per unit of scale
+IIASA_YEARS = range(1900, 2021)
+IIASA_TYPES = ['Final Energy', 'Useful Energy', 'Primary Energy']
+IIASA_SECTORS = ['All Sectors', 'Industry']
+IIASA_FUELS = ['Electricity', 'Coal Products', 'Natural Gas', 'Petroleum Products', 'All Fuels', 'Biomass', 'Heat']
+IIASA_FILLER = 5
+EMBER_YEARS = range(2000, 2024)
+EMBER_CATEGORIES = ['Electricity generation', 'Capacity']
+EMBER_VARIABLES = ['Coal', 'Gas', 'Other Fossil', 'Wind', 'Solar', 'Hydro', 'Bioenergy', 'Nuclear',
+                   'Other Renewables', 'Fossil', 'Total Generation']
+EMBER_FILLER = 10
+HISTORY_YEARS = range(1985, 2024)
+HISTORY_SUFFIX = ' - TWh (adapted for visualization of chart electricity-prod-source-stacked)'
+HISTORY_COLUMNS = ['Electricity from coal', 'Electricity from gas', 'Electricity from oil', 'Electricity from nuclear',
+                   'Electricity from hydro', 'Electricity from wind', 'Electricity from solar',
+                   'Electricity from bioenergy', 'Other renewables excluding bioenergy']
+HISTORY_FILLER = 10
+
+# File names as in generate_all_charts
+FILE_NAMES = {
+    'IIASA_FILE': 'IIASA_dataset.csv',
+    'IEA_FILE': 'WORLDBAL - with2023.TXT',
+    'EMBER_FILE': 'Ember Electricity Generation Data.xlsx',
+    'NEW_EMBER_FILE': 'electricity-prod-source-stacked.csv',
+}
+
+def filler_codes(prefix, count):
+    return [f'{prefix}{i:05d}' for i in range(count)]
+
+def iiasa_regions():
+    regions = set(g.IIASA_TO_DISPLAY)
+    for pos, neg in g.IIASA_CALC_REGIONS.values():
+        regions.update(pos)
+        regions.update(neg)
+    return regions
+
+def ember_areas():
+    return set(g.EMBER_CODES_TO_LOAD) | set(g.REGION_CONFIG)
+
+def write_worldbal(path, scale=1, seed=SEED):
+    # Sorted by country like the real dump, with missing ('..'), confidential ('x')
+    # and empty values mixed in
+    rng = random.Random(seed)
+    codes = sorted(set(g.IEA_CODES_TO_LOAD) | set(filler_codes('ZZ', IEA_FILLER * scale)))
+    with open(path, 'w', encoding='latin-1', newline='\n') as f:
+        for code in codes:
+            for product in IEA_PRODUCTS:
+                for year in IEA_YEARS:
+                    for flow in IEA_FLOWS:
+                        for unit in IEA_UNITS:
+                            r = rng.random()
+                            value = '..' if r < 0.05 else 'x' if r < 0.07 else '' if r < 0.08 else \
+                                f"{rng.uniform(0, 5000) * (4 if product == 'TOTAL' else 1):.3f}"
+                            fields = [code, product, str(year), flow, unit, value]
+                            f.write(''.join(field.ljust(IEA_FIELD_WIDTH) for field in fields).rstrip() + '\n')
+
+def write_iiasa(path, scale=1, seed=SEED):
+    rng = random.Random(seed)
+    regions = sorted(iiasa_regions() | set(filler_codes('Region ', IIASA_FILLER * scale)))
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Type', 'Sector', 'Region', 'Fuel', 'Unit'] + [str(y) for y in IIASA_YEARS])
+        for iiasa_type in IIASA_TYPES:
+            factor = 0.4 if iiasa_type == 'Useful Energy' else 1
+            for sector in IIASA_SECTORS:
+                for region in regions:
+                    for fuel in IIASA_FUELS:
+                        base = rng.uniform(10, 1000) * (5 if fuel == 'All Fuels' else 1) * factor
+                        row = [iiasa_type, sector, region, fuel, 'EJ']
+                        for year in IIASA_YEARS:
+                            r = rng.random()
+                            row.append('' if r < 0.1 else 'n/a' if r < 0.12 else
+                                       f'{base * (1 + (year - 1900) / 50) * rng.uniform(0.5, 1.5):.3f}')
+                        writer.writerow(row)
+
+def ember_table(scale=1, seed=SEED):
+    rng = random.Random(seed)
+    rows = []
+    for area in sorted(ember_areas() | set(filler_codes('Area ', EMBER_FILLER * scale))):
+        for year in EMBER_YEARS:
+            for category in EMBER_CATEGORIES:
+                for variable in EMBER_VARIABLES:
+                    if rng.random() < 0.05: continue
+                    value = rng.uniform(0, 300) if rng.random() > 0.03 else float('nan')
+                    rows.append((area, 'XX', year, category, 'Fuel', variable, 'TWh', value))
+    return pd.DataFrame(rows, columns=['Area', 'Country code', 'Year', 'Category', 'Subcategory', 'Variable', 'Unit', 'Value'])
+
+def write_ember_xlsx(path, scale=1, seed=SEED):
+    ember_table(scale, seed).to_excel(path, index=False)
+
+def write_ember_history(path, scale=1, seed=SEED):
+    rng = random.Random(seed)
+    rows = []
+    for entity in sorted(set(g.REGION_CONFIG) | set(filler_codes('Entity ', HISTORY_FILLER * scale))):
+        for year in HISTORY_YEARS:
+            values = [rng.uniform(0, 200) if rng.random() > 0.05 else None for _ in HISTORY_COLUMNS]
+            rows.append([entity, 'XX', year] + values)
+    columns = ['Entity', 'Code', 'Year'] + [c + HISTORY_SUFFIX for c in HISTORY_COLUMNS]
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+
+WRITERS = {
+    'IIASA_FILE': write_iiasa,
+    'IEA_FILE': write_worldbal,
+    'EMBER_FILE': write_ember_xlsx,
+    'NEW_EMBER_FILE': write_ember_history,
+}
+
+def write_inputs(directory, scale=1, seed=SEED):
+    """
+    Write all four inputs into directory (skipping files that already exist, as
+    generating the larger scales takes a while) and return {setting: path} for the
+    generate_all_charts file settings (IIASA_FILE, IEA_FILE, ...).
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for setting, name in FILE_NAMES.items():
+        path = paths[setting] = os.path.join(directory, name)
+        if os.path.exists(path): continue
+        print(f"Generating {path}...")
+        tmp_path = os.path.join(directory, 'tmp-' + name) # Keeps the extension for pandas
+        WRITERS[setting](tmp_path, scale, seed)
+        os.replace(tmp_path, path)
+    return paths
@@ -4,6 +4,10 @@ import os
 import csv
 from collections import defaultdict
 
+import numpy as np
+
+from efficiency_factors import FACTOR_YEARS, factor_series, valid_ratios
+
 # Paths (from generate_all_charts.py)
 BASE_DIR = '/Users/daanwalter/Library/CloudStorage/OneDrive-SharedLibraries-Ember/ember-futures - Documents/03 Research/2026/97 Ideas/Ternary Chart Playground'
 DATA_DIR = os.path.join(BASE_DIR, 'data')
@@ -64,50 +68,32 @@ for region_dict in [iiasa_final, iiasa_useful]:
             foss = rec.get('fossil', 0)
             rec['bio'] = max(0, total - elec - foss)
 
-# Calculate Factors
-eff_factors_map = defaultdict(lambda: defaultdict(dict))
-for country in REGION_CONFIG.keys():
-    for cat in ['electrons', 'fossil', 'bio']:
-        known_years = []
-        known_factors = []
-        possible_years = sorted(list(set(iiasa_final[country].keys()) | set(iiasa_useful[country].keys())))
-        for y in possible_years:
-            fin = iiasa_final[country][y].get(cat, 0)
-            use = iiasa_useful[country][y].get(cat, 0)
-            if fin > 0 and use > 0:
-                ratio = use / fin
-                if 0 < ratio < 5: 
-                    known_years.append(y)
-                    known_factors.append(ratio)
-        
-        if not known_years:
-            eff_factors_map[country][cat] = defaultdict(lambda: 1.0)
-            continue
-            
-        full_series = {}
-        min_y, max_y = known_years[0], known_years[-1]
-        for y in range(1900, 2024):
-            if y in known_years:
-                full_series[y] = known_factors[known_years.index(y)]
-            elif y < min_y:
-                full_series[y] = known_factors[0]
-            elif y > max_y:
-                full_series[y] = known_factors[-1]
-            else:
-                prev_y = max([ky for ky in known_years if ky < y])
-                next_y = min([ky for ky in known_years if ky > y])
-                prev_val = known_factors[known_years.index(prev_y)]
-                next_val = known_factors[known_years.index(next_y)]
-                frac = (y - prev_y) / (next_y - prev_y)
-                full_series[y] = prev_val + frac * (next_val - prev_val)
-        eff_factors_map[country][cat] = full_series
+# Calculate Factors (same interpolation as generate_all_charts.py)
+regions = list(REGION_CONFIG.keys())
+cats = ['electrons', 'fossil', 'bio']
+data_years = {y for region_dict in [iiasa_final, iiasa_useful] for country in regions for y in region_dict[country]}
+years = list(range(min(data_years | {FACTOR_YEARS[0]}), max(data_years | {FACTOR_YEARS[1]}) + 1))
+final = np.zeros((len(regions), len(years), len(cats)))
+useful = np.zeros_like(final)
+for ri, country in enumerate(regions):
+    for yi, y in enumerate(years):
+        for ci, cat in enumerate(cats):
+            final[ri, yi, ci] = iiasa_final[country].get(y, {}).get(cat, 0)
+            useful[ri, yi, ci] = iiasa_useful[country].get(y, {}).get(cat, 0)
+factors = factor_series(final, useful, years)
+known = valid_ratios(final, useful)[1].any(axis=1) # regions x cats
+
+def factor(country, cat, year):
+    ri, ci = regions.index(country), cats.index(cat)
+    if not known[ri, ci] or not FACTOR_YEARS[0] <= year <= FACTOR_YEARS[1]: return "N/A"
+    return factors[ri, years.index(year), ci]
 
 print("\nFactors for OECD (1990 Members):")
 for cat in ['electrons', 'fossil', 'bio']:
-    f = eff_factors_map['OECD (1990 Members)'][cat].get(2020, "N/A")
+    f = factor('OECD (1990 Members)', cat, 2020)
     print(f"  {cat}: {f}")
 
 print("\nFactors for Europe (before proxy):")
 for cat in ['electrons', 'fossil', 'bio']:
-    f = eff_factors_map['Europe'][cat].get(2020, "N/A")
+    f = factor('Europe', cat, 2020)
     print(f"  {cat}: {f}")
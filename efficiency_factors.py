@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Useful/Final efficiency factors from the IIASA series.
+The ratio is known for the years where both series are usable; every other year
+in FACTOR_YEARS is filled per series: constant backcast, linear interpolation
+between known years, constant forecast. All series are filled at once with array
+operations instead of searching the known years for every gap year.
+"""
+
+import numpy as np
+
+FACTOR_YEARS = (1900, 2023) # Years that get a factor; others keep the default
+MAX_RATIO = 5 # Sanity check: larger Useful/Final ratios are treated as bad data
+
+def valid_ratios(final, useful):
+    # Useful/Final ratios and where they are usable (both positive, 0 < ratio < MAX_RATIO)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = useful / final
+    valid = (final > 0) & (useful > 0) & (ratios > 0) & (ratios < MAX_RATIO)
+    return ratios, valid
+
+def fill_series(years, values, valid, default=1.0):
+    """
+    Fill every series along the last axis from its valid points.
+    years: 1-d ascending, values/valid: (..., len(years)).
+    Before the first valid year the first value is repeated, after the last the last
+    one; in between prev + frac * (next - prev) (the same arithmetic as the scalar
+    version, so results are identical). Series without valid points and years
+    outside FACTOR_YEARS get default.
+    """
+    years = np.asarray(years, dtype=np.float64)
+    n = len(years)
+    pos = np.arange(n)
+    # Index of the nearest valid point at or before / at or after each year
+    prev = np.maximum.accumulate(np.where(valid, pos, -1), axis=-1)
+    nxt = np.minimum.accumulate(np.where(valid, pos, n)[..., ::-1], axis=-1)[..., ::-1]
+    prev_i, next_i = np.clip(prev, 0, n - 1), np.clip(nxt, 0, n - 1)
+    prev_val = np.take_along_axis(values, prev_i, axis=-1)
+    next_val = np.take_along_axis(values, next_i, axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = (years - years[prev_i]) / (years[next_i] - years[prev_i])
+        between = prev_val + frac * (next_val - prev_val)
+    out = np.where(prev < 0, next_val, np.where(nxt >= n, prev_val, between)) # Backcast / forecast
+    out = np.where(valid, values, out)
+
+    in_range = (years >= FACTOR_YEARS[0]) & (years <= FACTOR_YEARS[1])
+    return np.where(valid.any(axis=-1, keepdims=True) & in_range, out, default)
+
+def factor_series(final, useful, years, year_axis=-2):
+    """
+    Efficiency factors for Final/Useful arrays that share a year axis (by default
+    the second to last, as in regions x years x categories). 1.0 where unknown.
+    """
+    ratios, valid = valid_ratios(final, useful)
+    factors = fill_series(years, np.moveaxis(ratios, year_axis, -1), np.moveaxis(valid, year_axis, -1))
+    return np.moveaxis(factors, -1, year_axis)
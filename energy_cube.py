@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Dense array storage for the energy series.
+An EnergyCube holds one float64 array indexed by region x year x source x metric x
+category, with small label -> index maps per axis. NaN marks "no data".
+"""
+
+import numpy as np
+
+METRICS = ['final', 'useful', 'power']
+CATEGORIES = ['electrons', 'fossil', 'bio', 'wind_solar', 'other', 'total']
+
+# Ternary axes per metric (the remaining share of each record is 'total')
+FINAL_CATS = ['electrons', 'fossil', 'bio']
+POWER_CATS = ['fossil', 'wind_solar', 'other']
+
+class EnergyCube:
+    def __init__(self, regions, years, sources, metrics=METRICS, categories=CATEGORIES, origins=()):
+        self.regions = list(regions)
+        self.years = list(years)
+        self.sources = list(sources)
+        self.metrics = list(metrics)
+        self.categories = list(categories)
+        self.region_index = {r: i for i, r in enumerate(self.regions)}
+        self.year_index = {y: i for i, y in enumerate(self.years)}
+        self.source_index = {s: i for i, s in enumerate(self.sources)}
+        self.metric_index = {m: i for i, m in enumerate(self.metrics)}
+        self.cat_index = {c: i for i, c in enumerate(self.categories)}
+        self.values = np.full((len(self.regions), len(self.years), len(self.sources),
+                               len(self.metrics), len(self.categories)), np.nan)
+        # Label of the input behind each derived series, e.g. 'IEA' or 'Ember (Calc)'
+        self.origins = list(origins)
+        self.origin = np.full((len(self.regions), len(self.years), len(self.metrics)), -1, dtype=np.int8)
+
+    @property
+    def year_array(self):
+        return np.array(self.years, dtype=np.int64)
+
+    def cats(self, names):
+        return [self.cat_index[c] for c in names]
+
+    def view(self, source, metric):
+        # regions x years x categories (a view: writes go to the cube)
+        return self.values[:, :, self.source_index[source], self.metric_index[metric], :]
+
+    def present(self, source, metric):
+        # regions x years: True where any category has data
+        return ~np.isnan(self.view(source, metric)).all(axis=-1)
+
+    def fill_store(self, store, source, metric):
+        # Copy a nested Region -> Year -> Category -> Value store into the cube
+        data = self.view(source, metric)
+        for region, by_year in store.items():
+            r = self.region_index.get(region)
+            if r is None: continue
+            for year, by_cat in by_year.items():
+                y = self.year_index[year]
+                for cat, value in by_cat.items():
+                    data[r, y, self.cat_index[cat]] = value
+
+    def set_origin(self, mask, metric, label):
+        self.origin[:, :, self.metric_index[metric]][mask] = self.origins.index(label)
+
+class RegionMembership:
+    """
+    Sparse +-1 membership matrix of derived regions over source codes.
+    Stored in ELL layout: term slot j of every target row sits in cols[j] / signs[j]
+    (sign 0 = padding). aggregate() multiplies it against a code-level array one term
+    slot at a time for all targets together, which keeps each row's sum in rule order
+    (positives, then negatives) and so bit-for-bit stable.
+    """
+    def __init__(self, terms):
+        # terms: one [(code_row, sign), ...] list per target row
+        width = max((len(t) for t in terms), default=0)
+        self.cols = np.zeros((width, len(terms)), dtype=np.intp)
+        self.signs = np.zeros((width, len(terms)))
+        for row, row_terms in enumerate(terms):
+            for j, (col, sign) in enumerate(row_terms):
+                self.cols[j, row] = col
+                self.signs[j, row] = sign
+
+    def aggregate(self, values, present):
+        """
+        values: codes x years x cats (NaN = no data), present: codes x years.
+        Returns (targets x years x cats sums, targets x years any-member-present).
+        """
+        values = np.nan_to_num(values)
+        n_targets = self.cols.shape[1]
+        out = np.zeros((n_targets,) + values.shape[1:])
+        any_present = np.zeros((n_targets,) + present.shape[1:], dtype=bool)
+        for cols, signs in zip(self.cols, self.signs):
+            rows = np.flatnonzero(signs)
+            out[rows] += signs[rows, None, None] * values[cols[rows]]
+            any_present[rows] |= present[cols[rows]]
+        return out, any_present
+
+def year_range(*stores):
+    # Contiguous year axis covering every year in the given nested stores
+    years = {y for store in stores for by_year in store.values() for y in by_year}
+    if not years: return []
+    return list(range(min(years), max(years) + 1))
+
+def round2(values):
+    """
+    Same result as round(x, 2) for every element.
+    np.round rounds x * 100 half-to-even, which is wrong when the product lands
+    exactly on .5 but x itself is just above or below the tie (e.g. 6127.645),
+    so those elements are redone with round().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.ravel()
+    scaled = flat * 100
+    out = np.round(scaled) / 100
+    ties = np.flatnonzero(scaled - np.floor(scaled) == 0.5)
+    if len(ties):
+        out[ties] = [round(v, 2) for v in flat[ties].tolist()]
+    return out.reshape(values.shape)
+
+def percentages(data, cat_idx, total_idx):
+    # x / total * 100 for the given categories, rounded like the JSON output
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return round2(data[..., cat_idx] / data[..., total_idx, None] * 100)
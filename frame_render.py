@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Headless PNG frames of the web app's year-by-year playback, for animations:
+per year, the selected regions' trails up to that year and their latest point,
+in the chart layout of svg_export. Frames are drawn with Pillow (only needed
+here) at SUPERSAMPLE times the size and scaled down for smooth lines, in a
+process pool across years. They are written as <mode>/<year>.png and can also be
+piped, in order, into an encoder such as ffmpeg. The frames only depend on the
+data, so a CI run reproduces them byte for byte.
+Run it through `python -m ternary frames`.
+"""
+
+import json
+import multiprocessing
+import os
+import shlex
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+from svg_export import CORNER_LABELS, HEIGHT, MARGIN, MODE_TITLES, WIDTH, grid_lines, mode_series, triangle_corners
+from ternary_geometry import CORNER_CATS, POWER_TRAIL_START, chart_frame, mode_xy, to_chart, trail_geometry
+
+SUPERSAMPLE = 2 # Drawn at 2x and box-filtered down, as Pillow does not antialias lines
+PNG_COMPRESS_LEVEL = 1 # zlib level: larger files, but the encoding dominated the render time at the default of 6
+DEFAULT_REGIONS = ['United States', 'China', 'Germany', 'India', 'Brazil', 'World', 'Europe'] # app.js's initial selection
+FIRST_YEAR = 1900 # First frame, like the web app's slider (power starts at POWER_TRAIL_START)
+BACKGROUND = '#ffffff'
+GRID_COLOR = '#eeeeee'
+OUTLINE_COLOR = '#cccccc'
+LABEL_COLOR = '#555555'
+# Example encoder: ffmpeg -y -f image2pipe -framerate 10 -c:v png -i - -pix_fmt yuv420p ternary-{mode}.mp4
+
+_worker = {} # Trails and colors of the render processes (set by _init_worker)
+
+def region_trails(series):
+    # {(region, mode): (years, trail, smoothed trail, trail_start)} from mode_series()
+    trails = {}
+    for (region, mode), (years, pcts) in series.items():
+        xy = mode_xy(pcts, list(CORNER_CATS[mode]), mode)
+        trail, smooth, _, trail_start = trail_geometry(years, xy, np.ones(len(years), dtype=bool), mode)
+        trails[(region, mode)] = (years, trail, smooth, trail_start)
+    return trails
+
+def _init_worker(trails, colors):
+    _worker.update(trails=trails, colors=colors, backgrounds={})
+
+def background(mode):
+    # Triangle, grid and corner labels of a mode at SUPERSAMPLE size, drawn once per process
+    if mode not in _worker.setdefault('backgrounds', {}):
+        s = SUPERSAMPLE
+        image = Image.new('RGB', (WIDTH * s, HEIGHT * s), BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default(size=18 * s)
+        corners = triangle_corners(chart_frame(WIDTH * s, HEIGHT * s, MARGIN * s))
+        for p, q in grid_lines(corners):
+            draw.line([tuple(p), tuple(q)], fill=GRID_COLOR, width=s)
+        draw.polygon([tuple(c) for c in corners], outline=OUTLINE_COLOR, width=2 * s)
+        bio, elec, foss = CORNER_LABELS[mode]
+        draw.text((corners[0][0], corners[0][1] - 12 * s), bio, fill=LABEL_COLOR, font=font, anchor='ls')
+        draw.text((corners[1][0], corners[1][1] - 12 * s), elec, fill=LABEL_COLOR, font=font, anchor='rs')
+        draw.text((corners[2][0], corners[2][1] + 28 * s), foss, fill=LABEL_COLOR, font=font, anchor='ms')
+        _worker['backgrounds'][mode] = image
+    return _worker['backgrounds'][mode]
+
+def render_frame(task):
+    """
+    PNG bytes of the frame of (mode, year, smoothed): like the web app at that
+    year, every region's trail from its first drawn year up to its latest
+    record, and a point at that record.
+    """
+    mode, year, smoothed = task
+    s = SUPERSAMPLE
+    frame = chart_frame(WIDTH * s, HEIGHT * s, MARGIN * s)
+    image = background(mode).copy()
+    draw = ImageDraw.Draw(image)
+    draw.text((MARGIN * s, (HEIGHT - MARGIN) * s), f'{MODE_TITLES[mode]} {year}', fill=LABEL_COLOR,
+              font=ImageFont.load_default(size=32 * s), anchor='ls')
+
+    points = []
+    for region, color in _worker['colors'].items():
+        if (region, mode) not in _worker['trails']: continue
+        years, trail, smooth, trail_start = _worker['trails'][(region, mode)]
+        end = int(np.searchsorted(years, year, side='right')) # Records up to this year
+        if end == 0: continue
+        line = to_chart((smooth if smoothed else trail)[trail_start:end], frame)
+        if len(line) > 1:
+            draw.line([tuple(p) for p in line], fill=color, width=3 * s, joint='curve')
+        points.append((to_chart(trail[end - 1], frame), color))
+    # Points over all trails, as in the web app
+    for (x, y), color in points:
+        r = 6 * s
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=color, outline='white', width=2 * s)
+
+    out = BytesIO()
+    image.reduce(s).save(out, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return out.getvalue()
+
+def frame_years(trails, mode, year_span=None):
+    # Years to render for a mode: the slider's range up to the last record, or year_span
+    if year_span: return range(year_span[0], year_span[1] + 1)
+    last = max((years[-1] for (_, m), (years, _, _, _) in trails.items() if m == mode), default=None)
+    if last is None: return range(0)
+    return range(POWER_TRAIL_START if mode == 'power' else FIRST_YEAR, int(last) + 1)
+
+def render_frames(data_path, out_dir, region_colors, modes=CORNER_CATS, year_span=None, smoothed=False,
+                  jobs=1, encode=None):
+    """
+    Render the frames of every mode for the regions in region_colors ({region:
+    color}, drawn in that order) into out_dir/<mode>/<year>.png, in jobs
+    processes. encode is an optional command line ({mode} is filled in) that
+    gets each mode's frames as PNGs on its stdin. Returns {mode: [paths]}.
+    """
+    if Image is None:
+        raise ImportError("Rendering frames needs Pillow (pip install pillow)")
+    with open(data_path, encoding='utf-8') as f:
+        data = json.load(f)
+    trails = region_trails(mode_series(data, region_colors, modes))
+
+    # Forked workers would inherit the encoder pipe and keep it open after we close it, so spawn them then
+    context = multiprocessing.get_context('spawn') if encode else None
+    pool = ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=_init_worker,
+                               initargs=(trails, region_colors)) if jobs > 1 else None
+    if pool is None: _init_worker(trails, region_colors)
+    written = {}
+    try:
+        for mode in modes:
+            years = frame_years(trails, mode, year_span)
+            os.makedirs(os.path.join(out_dir, mode), exist_ok=True)
+            encoder = subprocess.Popen(shlex.split(encode.format(mode=mode)), stdin=subprocess.PIPE) if encode else None
+            tasks = [(mode, year, smoothed) for year in years]
+            frames = pool.map(render_frame, tasks, chunksize=max(1, len(tasks) // (jobs * 4))) if pool else map(render_frame, tasks)
+            written[mode] = []
+            for year, png in zip(years, frames):
+                path = os.path.join(out_dir, mode, f'{year}.png')
+                with open(path, 'wb') as f:
+                    f.write(png)
+                written[mode].append(path)
+                if encoder:
+                    try:
+                        encoder.stdin.write(png)
+                    except BrokenPipeError:
+                        raise RuntimeError(f"Encoder exited with {encoder.wait()}: {encode}")
+            if encoder:
+                encoder.stdin.close()
+                if encoder.wait(): raise RuntimeError(f"Encoder exited with {encoder.returncode}: {encode}")
+    finally:
+        if pool: pool.shutdown()
+    return written
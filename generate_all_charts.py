@@ -5,9 +5,14 @@ Matches the exact visual style of the provided example.
 """
 
 import csv
+import hashlib
 import json
-from collections import defaultdict
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 
 # Paths
 BASE_DIR = '/Users/daanwalter/Library/CloudStorage/OneDrive-SharedLibraries-Ember/ember-futures - Documents/03 Research/2026/97 Ideas/Ternary Chart Playground'
@@ -18,8 +23,33 @@ EMBER_FILE = os.path.join(DATA_DIR, 'Ember Electricity Generation Data.xlsx')
 NEW_EMBER_FILE = os.path.join(DATA_DIR, 'electricity-prod-source-stacked.csv')
 OUTPUT_HTML = os.path.join(BASE_DIR, 'all_countries_ternary_charts.html')
 OUTPUT_JSON = os.path.join(BASE_DIR, 'data.json')
-
+CACHE_DIR = os.path.join(BASE_DIR, 'cache') # Parsed raw stores; set to None to always reparse
+DEFAULT_JOBS = os.cpu_count() or 1 # Input loaders plus WORLDBAL byte ranges
+IEA_EXTRACT = False # Read WORLDBAL through a filtered extract in CACHE_DIR (see iea_extract; needs CACHE_DIR)
+HTML_DATA = 'embedded' # 'embedded': data inlined in OUTPUT_HTML, 'external': content-hashed data file next to it
+STAGE_REPORT = os.path.join(BASE_DIR, 'stage_report.jsonl') # Time/memory/rows per pipeline stage as JSON lines; None to skip
+PROFILE_DIR = None # Directory for per-stage cProfile stats (see --profile)
+RUN_ID = None # Tags the stage records of one run (set by main)
+INCREMENTAL = True # Only recompute regions whose inputs changed since the last run (needs CACHE_DIR)
+TRAIL_LOD = True # Also write the trails simplified at ternary_geometry.LOD_TOLERANCES with the packed data
+
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow # Feather support for the converted Ember workbook
+except ImportError:
+    pyarrow = None
+
+import raw_cache
+import worldbal
+from efficiency_factors import factor_series
+from energy_cube import EnergyCube, RegionMembership, FINAL_CATS, POWER_CATS, percentages, round2, year_range
+from json_stream import stream_json
+from packed_data import trail_lods, write_packed, write_shards
+from tidy_export import TIDY_FORMATS, tidy_table, write_tidy
+import region_state
+import stage_metrics
+from ternary_geometry import LOD_TOLERANCES
 
 # Region configuration with calculation rules for IEA
 REGION_CONFIG = {
@@ -83,48 +113,62 @@ for v in REGION_CONFIG.values():
         IEA_CODES_TO_LOAD.update(pos_list)
         IEA_CODES_TO_LOAD.update(neg)
 
+# Ember areas: all explicit codes AND all codes mentioned in calcs
+EMBER_CODES_TO_LOAD = set()
+for v in REGION_CONFIG.values():
+    if 'ember' in v: EMBER_CODES_TO_LOAD.add(v['ember'])
+    if 'ember_calc' in v:
+        pos, neg = v['ember_calc']
+        EMBER_CODES_TO_LOAD.update(pos)
+        EMBER_CODES_TO_LOAD.update(neg)
+
+# Region rule keys per source: (direct code, calculation)
+SOURCE_RULE_KEYS = {'IEA': ('iea', 'iea_calc'), 'IIASA': ('iiasa', 'iiasa_calc'), 'Ember': ('ember', 'ember_calc')}
+SOURCES = ['IEA', 'IIASA', 'Ember', 'Ember (History)']
+# Values of the 'source' field in the output
+ORIGINS = ['IEA', 'IIASA', 'Ember', 'Ember (Calc)', 'Ember (History)']
+
 # IIASA fuel classification
 IIASA_ELECTRONS = ['Electricity']
 IIASA_FOSSIL = ['Coal Products', 'Natural Gas', 'Petroleum Products']
 IIASA_TOTAL = ['All Fuels'] # Used to calculate "Bio and other" as residual
+IIASA_TYPES = ['Final Energy', 'Useful Energy'] # Useful/Final gives the efficiency factors
 
 # IEA product classification
 IEA_ELECTRONS = ['ELECTRICITY']
 IEA_FOSSIL = ['COAL', 'NATURAL_GAS', 'OIL_TOTAL']
 IEA_TOTAL = ['TOTAL'] # Used to calculate "Bio and other" as residual
+IEA_PRODUCTS = set(IEA_ELECTRONS + IEA_FOSSIL + IEA_TOTAL)
 
-def parse_iea_line(line):
-    if len(line) < 150: return None
-    country = line[0:30].strip()
-    product = line[30:60].strip()
-    year = line[60:90].strip()
-    flow = line[90:120].strip()
-    unit = line[120:150].strip()
-    value_str = line[150:180].strip()
-    if '..' in value_str or not value_str or 'x' in value_str: return None
-    try:
-        year = int(year)
-        value = float(value_str)
-    except (ValueError, TypeError): return None
-    return {'country': country, 'product': product, 'year': year, 'flow': flow, 'unit': unit, 'value': value}
+# Ember workbook columns we use (the rest is dropped on conversion)
+EMBER_COLUMNS = ['Area', 'Year', 'Category', 'Variable', 'Value']
 
-def load_iiasa_data(filepath):
-    # Raw IIASA store: Region -> Year -> Category -> Value
-    raw_iiasa = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-    
-    # Countries/Regions we need to load:
-    # 1. Explicitly mapped in IIASA_TO_DISPLAY
-    # 2. Components of IIASA_CALC_REGIONS
-    regions_to_load = set(IIASA_TO_DISPLAY.keys())
-    for pos, neg in IIASA_CALC_REGIONS.values():
-        regions_to_load.update(pos)
-        regions_to_load.update(neg)
+def stage(name):
+    # Measure a pipeline stage into STAGE_REPORT (see stage_metrics)
+    return stage_metrics.stage(name, STAGE_REPORT, PROFILE_DIR, RUN_ID)
+
+def store_rows(*stores):
+    # Number of region-year entries in raw stores
+    return sum(len(by_year) for store in stores for by_year in store.values())
+
+def load_raw_stores(name, filepath, params, build):
+    # Reuse the cached stores for filepath if it and params are unchanged
+    if not CACHE_DIR: return build()
+    return raw_cache.cached_stores(CACHE_DIR, name, [filepath], params, build)
+
+def load_raw_store(name, filepath, params, build):
+    return load_raw_stores(name, filepath, params, lambda: {name: build()})[name]
+
+def read_iiasa_raw(filepath, regions_to_load, metrics=None):
+    # Raw IIASA stores, one per Type: Type -> Region -> Year -> Category -> Value
+    raw_iiasa = {t: raw_cache.new_store() for t in IIASA_TYPES}
     
     print(f"Reading {filepath}...")
     with open(filepath, 'r', encoding='utf-8-sig') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            if row['Type'] != 'Final Energy' or row['Sector'] != 'All Sectors': continue
+            if row['Type'] not in raw_iiasa or row['Sector'] != 'All Sectors': continue
+            target = raw_iiasa[row['Type']]
             iiasa_region = row['Region']
             fuel = row['Fuel']
             if iiasa_region not in regions_to_load: continue
@@ -139,393 +183,151 @@ def load_iiasa_data(filepath):
                     try:
                         year = int(year_str)
                         value = float(val)
-                        raw_iiasa[iiasa_region][year][cat] += value
+                        target[iiasa_region][year][cat] += value
                     except ValueError: pass
-    
-    # Process into Display Names
-    energy_data = defaultdict(lambda: defaultdict(dict))
-    
-    for display_name, config in REGION_CONFIG.items():
-        # Direct Mapping
-        if 'iiasa' in config:
-            code = config['iiasa']
-            for year, cats in raw_iiasa[code].items():
-                energy_data[display_name][year] = cats.copy()
-        
-        # Calculated Mapping
-        elif 'iiasa_calc' in config:
-            pos_codes, neg_codes = config['iiasa_calc']
-            
-            # Find all relevant years
-            all_years = set()
-            for code in pos_codes + neg_codes:
-                all_years.update(raw_iiasa[code].keys())
-            
-            for year in all_years:
-                res = {'electrons': 0, 'fossil': 0, 'total': 0}
-                
-                # Add positives
-                for code in pos_codes:
-                    if year in raw_iiasa[code]:
-                        for c in res: res[c] += raw_iiasa[code][year].get(c, 0)
-                
-                # Subtract negatives
-                for code in neg_codes:
-                    if year in raw_iiasa[code]:
-                        for c in res: res[c] -= raw_iiasa[code][year].get(c, 0)
-                
-                # Ensure no negatives
-                for c in res: res[c] = max(0, res[c])
-                
-                if sum(res.values()) > 0:
-                    energy_data[display_name][year] = res
-    
-    # Calculate "Bio and other" as residual
-    for country in energy_data:
-        for year in energy_data[country]:
-            rec = energy_data[country][year]
-            total = rec.get('total', 0)
-            elec = rec.get('electrons', 0)
-            foss = rec.get('fossil', 0)
-            bio = max(0, total - elec - foss)
-            energy_data[country][year]['bio'] = bio
-            
-    return energy_data
-
-def load_iea_data(filepath):
-    # Raw IEA store: Code -> Year -> Category -> Value
-    raw_iea = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-    all_products = set(IEA_ELECTRONS + IEA_FOSSIL + IEA_TOTAL)
-    
-    print(f"Reading {filepath}...")
-    with open(filepath, 'r', encoding='latin-1') as f:
-        line_count = 0
-        for line in f:
-            line_count += 1
-            if line_count % 10000000 == 0: print(f"  Processed {line_count:,} lines...")
-            parsed = parse_iea_line(line)
-            if not parsed: continue
-            
-            if (parsed['country'] in IEA_CODES_TO_LOAD and parsed['product'] in all_products and
-                parsed['flow'] == 'TFC' and parsed['unit'] == 'KTOE'):
-                
-                cat = 'electrons' if parsed['product'] in IEA_ELECTRONS else 'fossil' if parsed['product'] in IEA_FOSSIL else 'total'
-                raw_iea[parsed['country']][parsed['year']][cat] += parsed['value']
-    
-    # Process into Display Names
-    energy_data = defaultdict(lambda: defaultdict(dict))
-    
-    for display_name, config in REGION_CONFIG.items():
-        # Direct Mapping
-        if 'iea' in config:
-            code = config['iea']
-            for year, cats in raw_iea[code].items():
-                energy_data[display_name][year] = cats.copy()
-        
-        # Calculated Mapping
-        elif 'iea_calc' in config:
-            pos_codes, neg_codes = config['iea_calc']
-            if isinstance(pos_codes, str): pos_codes = [pos_codes]
-            
-            # Find all relevant years
-            all_years = set()
-            for code in pos_codes + neg_codes:
-                all_years.update(raw_iea[code].keys())
-            
-            for year in all_years:
-                res = {'electrons': 0, 'fossil': 0, 'total': 0}
-                
-                # Add positives
-                for code in pos_codes:
-                    if year in raw_iea[code]:
-                        for c in res: res[c] += raw_iea[code][year].get(c, 0)
-                
-                # Subtract negatives
-                for code in neg_codes:
-                    if year in raw_iea[code]:
-                        for c in res: res[c] -= raw_iea[code][year].get(c, 0)
-                
-                # Ensure no negatives due to data mismatches (clamp to 0)
-                for c in res: res[c] = max(0, res[c])
-                
-                if sum(res.values()) > 0:
-                    energy_data[display_name][year] = res
+        if metrics: metrics.rows_in = reader.line_num - 1
+    return raw_iiasa
 
-    # Calculate "Bio and other" as residual
-    for country in energy_data:
-        for year in energy_data[country]:
-            rec = energy_data[country][year]
-            total = rec.get('total', 0)
-            elec = rec.get('electrons', 0)
-            foss = rec.get('fossil', 0)
-            bio = max(0, total - elec - foss)
-            energy_data[country][year]['bio'] = bio
-
-    return energy_data
-
-def main():
-    iiasa_data = load_iiasa_data(IIASA_FILE)
-    iea_data = load_iea_data(IEA_FILE)
-    
-    print("\nMerging datasets...")
-    results = []
-    source_counts = defaultdict(int)
-    overlap_prioritized = []
-
-    for display_name in REGION_CONFIG.keys():
-        all_years = set()
-        if display_name in iiasa_data: all_years.update(iiasa_data[display_name].keys())
-        if display_name in iea_data: all_years.update(iea_data[display_name].keys())
-        
-        for year in sorted(all_years):
-            # PRIORITIZE IEA DATA, BUT CHECK FOR COMPLETENESS (Bioenergy Gap)
-            has_iea = year in iea_data.get(display_name, {})
-            has_iiasa = year in iiasa_data.get(display_name, {})
-            
-            use_iea = False
-            
-            if has_iea:
-                iea_rec = iea_data[display_name][year]
-                iea_bio = iea_rec.get('bio', 0)
-                
-                # Checking for completeness:
-                # 1. Must have Bioenergy (unless year >= 1990)
-                # 2. Must have Fossil Fuels (to avoid "Electrons only" spikes like Other LAM 1971)
-                iea_fossil = iea_rec.get('fossil', 0)
-                
-                # Condition 1: Bioenergy check
-                bio_ok = (iea_bio > 0 or year >= 1990)
-                if not bio_ok and has_iiasa and iiasa_data[display_name][year].get('bio', 0) > 0:
-                    bio_ok = False
-                else:
-                    bio_ok = True # Either has bio, or trusted 0, or IIASA also has 0
-                
-                # Condition 2: Fossil check (Must have some fossil energy if IIASA has it)
-                fossil_ok = True
-                if iea_fossil == 0:
-                     if has_iiasa and iiasa_data[display_name][year].get('fossil', 0) > 0:
-                         fossil_ok = False
-                
-                if bio_ok and fossil_ok:
-                    use_iea = True
-                else:
-                    use_iea = False
-
-            if use_iea:
-                source_data = iea_data[display_name][year]
-                source_name = 'IEA'
-                if has_iiasa and not has_iea: # Should not happen with logic above, but for safety
-                     pass 
-                elif has_iiasa:
-                    overlap_prioritized.append((display_name, year))
-            elif has_iiasa:
-                source_data = iiasa_data[display_name][year]
-                source_name = 'IIASA'
-            else:
-                continue
-            
-            source_counts[source_name] += 1
-            electrons = source_data.get('electrons', 0)
-            fossil = source_data.get('fossil', 0)
-            bio = source_data.get('bio', 0)
-            total = electrons + fossil + bio
-            
-            if total > 0:
-                results.append({
-                    'country': display_name,
-                    'year': year,
-                    'electrons': round(electrons, 2),
-                    'fossil': round(fossil, 2),
-                    'bio': round(bio, 2),
-                    'total': round(total, 2),
-                    'electrons_pct': round(electrons / total * 100, 2),
-                    'fossil_pct': round(fossil / total * 100, 2),
-                    'bio_pct': round(bio / total * 100, 2),
-                    'source': source_name
-                })
-    
-    print(f"Generated {len(results)} merged records.")
-    
-    # Calculate Useful Energy
-    # Strategy: Calculate Efficiency Ratios from IIASA (Useful/Final) and apply to Merged Data
-    print("Calculating Useful Energy...")
-    
-    # Reload IIASA data specifically for Useful Energy to calculate ratios
-    # We need a strictly IIASA-only view for this to derive the factors
-    iiasa_final = defaultdict(lambda: defaultdict(dict))
-    iiasa_useful = defaultdict(lambda: defaultdict(dict))
-    
-    with open(IIASA_FILE, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['Sector'] != 'All Sectors': continue
-            region = row['Region']
-            if region not in IIASA_TO_DISPLAY: continue
-            display_name = IIASA_TO_DISPLAY[region]
-            fuel = row['Fuel']
-            
-
-            # Identify Category
-            cat = None
-            if fuel in IIASA_ELECTRONS: cat = 'electrons'
-            elif fuel in IIASA_FOSSIL: cat = 'fossil'
-            elif fuel in IIASA_TOTAL: cat = 'total'
-            else: continue
-            
+def load_iiasa_data(filepath):
+    # Read the IIASA file once for Final and Useful energy: {Type: raw store}
+    # Countries/Regions we need to load:
+    # 1. Explicitly mapped in IIASA_TO_DISPLAY
+    # 2. Components of IIASA_CALC_REGIONS
+    regions_to_load = set(IIASA_TO_DISPLAY.keys())
+    for pos, neg in IIASA_CALC_REGIONS.values():
+        regions_to_load.update(pos)
+        regions_to_load.update(neg)
 
-            # Determine Flow Type
-            target_dict = None
-            if row['Type'] == 'Final Energy': target_dict = iiasa_final
-            elif row['Type'] == 'Useful Energy': target_dict = iiasa_useful
-            else: continue
-            
-            for year_str, val in row.items():
-                if year_str.isdigit() and val:
-                    try:
-                        year = int(year_str)
-                        value = float(val)
-                        if cat not in target_dict[display_name][year]: target_dict[display_name][year][cat] = 0
-                        target_dict[display_name][year][cat] += value
+    params = {'regions': sorted(regions_to_load), 'types': IIASA_TYPES,
+              'fuels': [IIASA_ELECTRONS, IIASA_FOSSIL, IIASA_TOTAL]}
+    with stage('iiasa_parse') as metrics:
+        raw_iiasa = load_raw_stores('raw_iiasa', filepath, params, lambda: read_iiasa_raw(filepath, regions_to_load, metrics))
+        metrics.rows_out = store_rows(*raw_iiasa.values())
+    return raw_iiasa
+
+def scan_iea_records(filepath, executor=None, counts=None):
+    # TFC/KTOE records of the loaded codes and products, in file order.
+    # With a cache dir, only the byte blocks of those countries are read (the
+    # country index is built once per WORLDBAL file)
+    ranges = None
+    if CACHE_DIR:
+        index = raw_cache.cached_json(CACHE_DIR, 'worldbal_index', [filepath], {},
+                                      lambda: worldbal.build_country_index(filepath, executor))
+        ranges = worldbal.country_ranges(index, IEA_CODES_TO_LOAD)
+    print(f"Reading {filepath}...")
+    return worldbal.scan_iea_file(filepath, IEA_CODES_TO_LOAD, IEA_PRODUCTS, executor=executor, ranges=ranges, counts=counts)
 
-                    except ValueError: pass
-    
+def iea_extract(filepath, params, executor=None):
+    # Small WORLDBAL-format copy of just the rows load_iea_data uses, written on first use
+    def write(path):
+        records = list(scan_iea_records(filepath, executor))
+        worldbal.write_extract(path, records)
+        return len(records)
+    return raw_cache.cached_file(CACHE_DIR, 'worldbal_extract.txt', [filepath], params, write)
 
+def read_iea_raw(records):
+    # Raw IEA store: Code -> Year -> Category -> Value
+    raw_iea = raw_cache.new_store()
+    for parsed in records:
+        cat = 'electrons' if parsed['product'] in IEA_ELECTRONS else 'fossil' if parsed['product'] in IEA_FOSSIL else 'total'
+        raw_iea[parsed['country']][parsed['year']][cat] += parsed['value']
+    return raw_iea
+
+def load_iea_data(filepath, executor=None):
+    # executor: optional process pool to scan the file in parallel byte ranges
+    params = {'codes': sorted(IEA_CODES_TO_LOAD), 'products': [IEA_ELECTRONS, IEA_FOSSIL, IEA_TOTAL]}
+    counts = {} # Lines scanned (of the extract, when one is used)
+    def build():
+        if CACHE_DIR and IEA_EXTRACT:
+            extract = iea_extract(filepath, params, executor)
+            print(f"Reading {extract}...")
+            return read_iea_raw(worldbal.scan_iea_file(extract, IEA_CODES_TO_LOAD, IEA_PRODUCTS, counts=counts))
+        return read_iea_raw(scan_iea_records(filepath, executor, counts))
+    with stage('iea_parse') as metrics:
+        raw_iea = load_raw_store('raw_iea', filepath, params, build)
+        metrics.rows_in, metrics.rows_out = counts.get('lines'), store_rows(raw_iea)
+    return raw_iea
+
+def read_ember_table(filepath):
+    # The EMBER_COLUMNS of the Ember workbook. With a cache dir (and pyarrow) the
+    # xlsx is converted once to a Feather file with categorical columns, which later
+    # runs read instead of going through openpyxl
+    if not CACHE_DIR or pyarrow is None: return pd.read_excel(filepath, usecols=EMBER_COLUMNS)
+    def write(path):
+        table = pd.read_excel(filepath, usecols=EMBER_COLUMNS)[EMBER_COLUMNS]
+        for col in ['Area', 'Category', 'Variable']:
+            table[col] = table[col].astype('category')
+        table.to_feather(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return len(table)
+    path = raw_cache.cached_file(CACHE_DIR, 'ember_generation.feather', [filepath], {'columns': EMBER_COLUMNS}, write)
+    return pd.read_feather(path)
+
+def read_ember_raw(filepath, codes, metrics=None):
+    # Raw Ember store: Area -> Year -> {fossil, wind_solar, other, total} in TWh
+    raw_ember = raw_cache.new_store()
 
-    # Calculate Bio Residuals for Useful Energy Ratios
-    for region_dict in [iiasa_final, iiasa_useful]:
-        for country in region_dict:
-            for year in region_dict[country]:
-                rec = region_dict[country][year]
-                total = rec.get('total', 0)
-                elec = rec.get('electrons', 0)
-                foss = rec.get('fossil', 0)
-                rec['bio'] = max(0, total - elec - foss)
-
-    # Load Ember Data (Power Generation)
-    print(f"Reading {EMBER_FILE}...")
-    ember_raw = pd.read_excel(EMBER_FILE)
-    ember_data = defaultdict(lambda: defaultdict(dict))
-    
-    # Map for Ember Areas
-    EMBER_MAP = {v.get('ember', k): k for k, v in REGION_CONFIG.items() if 'ember' in v or 'ember_calc' not in v}
-    
-    # Calculate codes to load for Ember
-    EMBER_CODES_TO_LOAD = set()
-    for v in REGION_CONFIG.values():
-        if 'ember' in v: EMBER_CODES_TO_LOAD.add(v['ember'])
-        if 'ember_calc' in v:
-            pos, neg = v['ember_calc']
-            EMBER_CODES_TO_LOAD.update(pos)
-            EMBER_CODES_TO_LOAD.update(neg)
+    print(f"Reading {filepath}...")
+    ember_raw = read_ember_table(filepath)
+    if metrics: metrics.rows_in = len(ember_raw)
 
     # Filter Relevant Rows (Category=Electricity generation)
     gen_df = ember_raw[
-        (ember_raw['Category'] == 'Electricity generation') & 
-        (ember_raw['Area'].isin(EMBER_CODES_TO_LOAD))
+        (ember_raw['Category'] == 'Electricity generation') &
+        (ember_raw['Area'].isin(codes))
     ]
-    
+
     # Pivot to get variables as columns: Year, Area, Variable -> Value
     # Using 'Variable' column: 'Fossil', 'Wind and Solar', 'Total Generation'
     # 'Other' needs to be calculated: Total - Fossil - Wind&Solar
-    
-    # We'll group by Area, Year, Variable and sum Value (just in case there are dupes, though likely unique)
-    pivoted = gen_df.pivot_table(index=['Area', 'Year'], columns='Variable', values='Value', aggfunc='sum').reset_index()
 
-    # First, collect all raw data by area
-    raw_ember_by_area = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-    
-    for _, row in pivoted.iterrows():
-        area = row['Area']
-        year = int(row['Year'])
-        
-        def get_val(col_name):
-            val = row.get(col_name, 0)
-            return 0 if pd.isna(val) else val
-
-        coal = get_val('Coal')
-        gas = get_val('Gas')
-        other_fossil = get_val('Other Fossil')
-        fossil_sum = coal + gas + other_fossil
-        
-        wind = get_val('Wind')
-        solar = get_val('Solar')
-        ws_sum = wind + solar
-        
-        hydro = get_val('Hydro')
-        bio = get_val('Bioenergy')
-        nuc = get_val('Nuclear')
-        other_ren = get_val('Other Renewables')
-        other_sum = hydro + bio + nuc + other_ren
-        
-        total_calc = fossil_sum + ws_sum + other_sum
-        
-        if total_calc > 0:
-            raw_ember_by_area[area][year] = {
-                'fossil': fossil_sum,
-                'wind_solar': ws_sum,
-                'other': other_sum,
-                'total': total_calc,
-                'fossil_pct': round(fossil_sum / total_calc * 100, 2),
-                'wind_solar_pct': round(ws_sum / total_calc * 100, 2),
-                'other_pct': round(other_sum / total_calc * 100, 2),
-                'source': 'Ember'
-            }
+    # We'll group by Area, Year, Variable and sum Value (just in case there are dupes, though likely unique)
+    pivoted = gen_df.pivot_table(index=['Area', 'Year'], columns='Variable', values='Value', aggfunc='sum', observed=True).reset_index()
+
+    def column(name):
+        # Missing variables and NaNs count as 0
+        return pivoted[name].fillna(0).to_numpy() if name in pivoted else np.zeros(len(pivoted))
+
+    # Component sums for all rows at once (same summation order as per row)
+    fossil = column('Coal') + column('Gas') + column('Other Fossil')
+    wind_solar = column('Wind') + column('Solar')
+    other = column('Hydro') + column('Bioenergy') + column('Nuclear') + column('Other Renewables')
+    total = fossil + wind_solar + other
+
+    keep = total > 0
+    rows = zip(pivoted['Area'][keep].tolist(), pivoted['Year'][keep].astype(int).tolist(),
+               fossil[keep].tolist(), wind_solar[keep].tolist(), other[keep].tolist(), total[keep].tolist())
+    for area, year, fossil_sum, ws_sum, other_sum, total_calc in rows:
+        raw_ember[area][year].update({'fossil': fossil_sum, 'wind_solar': ws_sum, 'other': other_sum, 'total': total_calc})
+    return raw_ember
+
+def load_ember_data(filepath):
+    with stage('ember_xlsx') as metrics:
+        raw_ember = load_raw_store('raw_ember', filepath, {'codes': sorted(EMBER_CODES_TO_LOAD)},
+                                   lambda: read_ember_raw(filepath, EMBER_CODES_TO_LOAD, metrics))
+        metrics.rows_out = store_rows(raw_ember)
+    return raw_ember
+
+def load_ember_history(filepath):
+    with stage('ember_csv') as metrics:
+        history = read_ember_history(filepath, metrics)
+        metrics.rows_out = store_rows(history)
+    return history
+
+def read_ember_history(filepath, metrics=None):
+    # Extended Ember history (1985 onwards): Display Name -> Year -> {fossil, wind_solar, other, total}
+    history = raw_cache.new_store()
+    print(f"Reading {filepath}...")
+    new_ember_raw = pd.read_csv(filepath)
+    if metrics: metrics.rows_in = len(new_ember_raw)
 
-    # Now apply mappings and calculations
-    for country_key, config in REGION_CONFIG.items():
-        if 'ember_calc' in config:
-            pos_codes, neg_codes = config['ember_calc']
-            
-            all_years = set()
-            for code in pos_codes + neg_codes:
-                if code in raw_ember_by_area:
-                    all_years.update(raw_ember_by_area[code].keys())
-            
-            for year in all_years:
-                res = {'fossil': 0, 'wind_solar': 0, 'other': 0, 'total': 0}
-                for code in pos_codes:
-                    if code in raw_ember_by_area and year in raw_ember_by_area[code]:
-                        for c in ['fossil', 'wind_solar', 'other', 'total']: 
-                            res[c] += raw_ember_by_area[code][year].get(c, 0)
-                for code in neg_codes:
-                    if code in raw_ember_by_area and year in raw_ember_by_area[code]:
-                        for c in ['fossil', 'wind_solar', 'other', 'total']: 
-                            res[c] -= raw_ember_by_area[code][year].get(c, 0)
-                
-                for c in res: res[c] = max(0, res[c])
-                
-                if res['total'] > 0:
-                    ember_data[country_key][year] = {
-                        'fossil': res['fossil'],
-                        'wind_solar': res['wind_solar'],
-                        'other': res['other'],
-                        'total': res['total'],
-                        'fossil_pct': round(res['fossil'] / res['total'] * 100, 2),
-                        'wind_solar_pct': round(res['wind_solar'] / res['total'] * 100, 2),
-                        'other_pct': round(res['other'] / res['total'] * 100, 2),
-                        'source': 'Ember (Calc)'
-                    }
-        elif 'ember' in config:
-            code = config['ember']
-            if code in raw_ember_by_area:
-                for year, data in raw_ember_by_area[code].items():
-                    ember_data[country_key][year] = data
-        elif country_key in raw_ember_by_area:
-            # Fallback to direct name match if no explicit ember code
-            for year, data in raw_ember_by_area[country_key].items():
-                ember_data[country_key][year] = data
-             
-    # Load NEW Extended Ember Data (1985 onwards)
-    print(f"Reading {NEW_EMBER_FILE}...")
-    new_ember_raw = pd.read_csv(NEW_EMBER_FILE)
-    
     # Map for New Dataset Areas (Direct Match for most)
     # The config keys map to 'Entity' in CSV
     NEW_EMBER_MAP = {k: k for k in REGION_CONFIG.keys()} # Default to direct match
     # Specific Overrides if needed (e.g., US is 'United States' in new vs 'United States of America' in old)
     for k, v in REGION_CONFIG.items():
         if 'ember_new' in v: NEW_EMBER_MAP[v['ember_new']] = k
-    
+
     # Columns in new dataset
     # "Electricity from coal - TWh..." -> 'Coal'
     # "Electricity from gas - TWh..." -> 'Gas'
@@ -536,7 +338,7 @@ def main():
     # "Electricity from solar - TWh..." -> 'Solar'
     # "Electricity from bioenergy - TWh..." -> 'Bioenergy'
     # "Other renewables excluding bioenergy - TWh..." -> 'Other Renewables'
-    
+
     col_map = {
         'Electricity from coal - TWh (adapted for visualization of chart electricity-prod-source-stacked)': 'Coal',
         'Electricity from gas - TWh (adapted for visualization of chart electricity-prod-source-stacked)': 'Gas',
@@ -548,184 +350,508 @@ def main():
         'Electricity from bioenergy - TWh (adapted for visualization of chart electricity-prod-source-stacked)': 'Bioenergy',
         'Other renewables excluding bioenergy - TWh (adapted for visualization of chart electricity-prod-source-stacked)': 'Other Renewables'
     }
-    
-    for _, row in new_ember_raw.iterrows():
-        entity = row['Entity']
-        if entity not in NEW_EMBER_MAP and entity not in REGION_CONFIG: continue
-        
-        country_key = entity if entity in REGION_CONFIG else NEW_EMBER_MAP.get(entity)
-        if not country_key: continue
-        
-        year = int(row['Year'])
-        
-        # Only use if we don't already have better data from main Ember file (prioritize main for recent years, new for older)
-        # Actually, let's just overwrite/fill. Since main Ember usually starts 2000, this fills 1985-1999.
-        # Check if year exists in ember_data
-        if year in ember_data[country_key]: continue 
-        
-        # Calculate components
-        coal = row.get(next(k for k in col_map if 'coal' in k), 0)
-        gas = row.get(next(k for k in col_map if 'gas' in k), 0)
-        oil = row.get(next(k for k in col_map if 'oil' in k), 0)
-        nuc = row.get(next(k for k in col_map if 'nuclear' in k), 0)
-        hydro = row.get(next(k for k in col_map if 'hydro' in k), 0)
-        wind = row.get(next(k for k in col_map if 'wind' in k), 0)
-        solar = row.get(next(k for k in col_map if 'solar' in k), 0)
-        bio = row.get(next(k for k in col_map if 'bio' in k and 'excluding' not in k), 0)
-        other_ren = row.get(next(k for k in col_map if 'Other renewables' in k), 0)
-        
-        # Handle NaNs
-        def get_val(v): return 0 if pd.isna(v) else v
-        coal = get_val(coal); gas = get_val(gas); oil = get_val(oil);
-        nuc = get_val(nuc); hydro = get_val(hydro); wind = get_val(wind);
-        solar = get_val(solar); bio = get_val(bio); other_ren = get_val(other_ren);
-        
-        fossil = coal + gas + oil
-        wind_solar = wind + solar
-        other = nuc + hydro + bio + other_ren
-        total_gen = fossil + wind_solar + other
-        
-        if total_gen > 0:
-             ember_data[country_key][year] = {
-                 'fossil': fossil,
-                 'wind_solar': wind_solar,
-                 'other': other,
-                 'total': total_gen,
-                 'fossil_pct': round(fossil / total_gen * 100, 2),
-                 'wind_solar_pct': round(wind_solar / total_gen * 100, 2),
-                 'other_pct': round(other / total_gen * 100, 2),
-                 'source': 'Ember (History)'
-             }
-
-    # Compute Ratios and Apply to Results
-    # Result structure: {country: {year: {final: ..., useful: ..., power: ...}}}
-    combined_data = defaultdict(lambda: defaultdict(lambda: {'final': {}, 'useful': {}, 'power': {}}))
-    
-    # Pre-compute Efficiency Factors (Interpolated) for all countries/fuels
-    # Structure: eff_factors_map[country][cat] = {year: factor}
-    eff_factors_map = defaultdict(lambda: defaultdict(dict))
-    
-    for country in REGION_CONFIG.keys():
-        for cat in ['electrons', 'fossil', 'bio']:
-            # Gather known points
-            known_years = []
-            known_factors = []
-            
-            # Check years where we have both Final and Useful data in IIASA
-            possible_years = sorted(list(set(iiasa_final[country].keys()) | set(iiasa_useful[country].keys())))
-            for y in possible_years:
-                fin = iiasa_final[country][y].get(cat, 0)
-                use = iiasa_useful[country][y].get(cat, 0)
-                if fin > 0 and use > 0: # Only use if we have valid non-zero data for Ratio
-                    ratio = use / fin
-                    # Sanity check: Ratio shouldn't be wildly > 2 or < 0
-                    if 0 < ratio < 5: 
-                        known_years.append(y)
-                        known_factors.append(ratio)
-            
-            if not known_years:
-                # Default to 1.0 if no data ever
-                eff_factors_map[country][cat] = defaultdict(lambda: 1.0)
-                continue
-                
-            # Create Interpolation Function
-            # We will generate a map for the full range of years (1900-2023)
-            # Strategy: Linear Interpolation for gaps, Constant Extrapolation for ends
-            full_series = {}
-            min_y, max_y = known_years[0], known_years[-1]
-            
-            for y in range(1900, 2024):
-                if y in known_years:
-                    idx = known_years.index(y)
-                    full_series[y] = known_factors[idx]
-                elif y < min_y:
-                    full_series[y] = known_factors[0] # Constant Backcast
-                elif y > max_y:
-                    full_series[y] = known_factors[-1] # Constant Forecast
-                else:
-                    # Linear Interpolation
-                    # Find bounds
-                    prev_y = max([ky for ky in known_years if ky < y])
-                    next_y = min([ky for ky in known_years if ky > y])
-                    prev_val = known_factors[known_years.index(prev_y)]
-                    next_val = known_factors[known_years.index(next_y)]
-                    
-                    frac = (y - prev_y) / (next_y - prev_y)
-                    val = prev_val + frac * (next_val - prev_val)
-                    full_series[y] = val
-            
-            eff_factors_map[country][cat] = full_series
-
-    # Pre-fill with Final Energy results we already generated
-    for r in results:
-        c = r['country']
-        y = r['year']
-        combined_data[c][y]['final'] = {
-            'electrons': round(r['electrons'], 2),
-            'fossil': round(r['fossil'], 2),
-            'bio': round(r['bio'], 2),
-            'total': round(r['total'], 2),
-            'electrons_pct': r['electrons_pct'],
-            'fossil_pct': r['fossil_pct'],
-            'bio_pct': r['bio_pct'],
-            'source': r['source']
-        }
-        
-        # Calculate Useful
-        # Apply factor to the MERGED final energy (which might be IEA or IIASA)
-        useful_rec = {}
-        total_useful = 0
-        
-        for cat in ['electrons', 'fossil', 'bio']:
-            final_val = r[cat]
-            # Get interpolated factor
-            # If map has function (dict), use it. Else default 1.0
-            factor = 1.0
-            if c in eff_factors_map and cat in eff_factors_map[c]:
-                factor_dict = eff_factors_map[c][cat]
-                if isinstance(factor_dict, dict):
-                    factor = factor_dict.get(y, 1.0)
-                else:
-                    factor = 1.0
-            
-            # For calculated regions without their own factors, use OECD-90 as proxy
-            if factor == 1.0 and c in IIASA_CALC_REGIONS:
-                # Use OECD-90 factors as a reasonable proxy for calculated regions
-                if 'OECD (1990 Members)' in eff_factors_map and cat in eff_factors_map['OECD (1990 Members)']:
-                    proxy_dict = eff_factors_map['OECD (1990 Members)'][cat]
-                    if isinstance(proxy_dict, dict):
-                        factor = proxy_dict.get(y, 1.0)
-            
-            # Apply
-            useful_val = final_val * factor
-            useful_rec[cat] = useful_val
-            total_useful += useful_val
-            
-        # Percents
-        if total_useful > 0:
-            combined_data[c][y]['useful'] = {
-                'electrons': round(useful_rec['electrons'], 2),
-                'fossil': round(useful_rec['fossil'], 2),
-                'bio': round(useful_rec['bio'], 2),
-                'total': round(total_useful, 2),
-                'electrons_pct': round(useful_rec['electrons'] / total_useful * 100, 2),
-                'fossil_pct': round(useful_rec['fossil'] / total_useful * 100, 2),
-                'bio_pct': round(useful_rec['bio'] / total_useful * 100, 2),
-                'source': r['source']
-            }
-        else:
-             combined_data[c][y]['useful'] = combined_data[c][y]['final'] # Fallback if 0
-
-        # Inject Ember Power Data if available
-        if c in ember_data and y in ember_data[c]:
-            combined_data[c][y]['power'] = ember_data[c][y]
-
-    # Ensure all years from Ember are also included in combined_data (even if missing from Final/Useful)
-    for c, years in ember_data.items():
-        for y, data in years.items():
-            if y not in combined_data[c]:
-                combined_data[c][y]['power'] = data
 
+    # Display name per row: entities named like a display region win over overrides
+    entity_map = dict(NEW_EMBER_MAP)
+    entity_map.update({k: k for k in REGION_CONFIG})
+    country_keys = new_ember_raw['Entity'].map(entity_map)
+
+    columns = {v: k for k, v in col_map.items()}
+    def column(name):
+        # Missing columns and NaNs count as 0
+        return new_ember_raw[columns[name]].fillna(0).to_numpy() if columns[name] in new_ember_raw else np.zeros(len(new_ember_raw))
+
+    # Calculate components for all rows at once
+    fossil = column('Coal') + column('Gas') + column('Oil')
+    wind_solar = column('Wind') + column('Solar')
+    other = column('Nuclear') + column('Hydro') + column('Bioenergy') + column('Other Renewables')
+    total_gen = fossil + wind_solar + other
+
+    rows = pd.DataFrame({'country': country_keys, 'year': new_ember_raw['Year'],
+                         'fossil': fossil, 'wind_solar': wind_solar, 'other': other, 'total': total_gen})
+    rows = rows[rows['country'].notna() & (rows['total'] > 0)]
+    rows['year'] = rows['year'].astype(int)
+    # The first row for a year wins; the main Ember file takes priority over all of them at merge time
+    rows = rows.drop_duplicates(['country', 'year'], keep='first')
+
+    for country_key, year, fossil_sum, ws_sum, other_sum, total_sum in zip(*(rows[c].tolist() for c in rows.columns)):
+        history[country_key][year].update({'fossil': fossil_sum, 'wind_solar': ws_sum, 'other': other_sum, 'total': total_sum})
+    return history
+
+def _init_loader(settings):
+    # Worker processes may be spawned fresh (macOS), so re-apply the parent's settings
+    globals().update(settings)
+
+def empty_source(source):
+    # Stand-in for an input that is not read: IIASA is {Type: store}, the others one store
+    if source == 'IIASA': return {t: raw_cache.new_store() for t in IIASA_TYPES}
+    return raw_cache.new_store()
+
+def load_sources(jobs=1, sources=SOURCES):
+    """
+    Load the independent inputs, concurrently in a process pool when jobs > 1.
+    The IEA scan is driven from this process and spreads its byte ranges over the
+    same pool, so it picks up the workers the smaller loaders leave idle.
+    Inputs of sources not in `sources` are not read at all and come back empty.
+    Returns (raw_iiasa, raw_iea, raw_ember, ember_history).
+    """
+    loaders = {
+        'IIASA': (load_iiasa_data, IIASA_FILE),
+        'Ember': (load_ember_data, EMBER_FILE), # Ember Data (Power Generation)
+        'Ember (History)': (load_ember_history, NEW_EMBER_FILE), # NEW Extended Ember Data (1985 onwards)
+    }
+    loaders = {source: loader for source, loader in loaders.items() if source in sources}
+    loaded = {}
+    if jobs <= 1:
+        if 'IIASA' in loaders: loaded['IIASA'] = load_iiasa_data(IIASA_FILE)
+        if 'IEA' in sources: loaded['IEA'] = load_iea_data(IEA_FILE)
+        loaded.update({source: loader(path) for source, (loader, path) in loaders.items() if source != 'IIASA'})
+    else:
+        settings = {'CACHE_DIR': CACHE_DIR, 'STAGE_REPORT': STAGE_REPORT, 'PROFILE_DIR': PROFILE_DIR, 'RUN_ID': RUN_ID}
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_loader, initargs=(settings,)) as pool:
+            futures = {source: pool.submit(loader, path) for source, (loader, path) in loaders.items()}
+            if 'IEA' in sources: loaded['IEA'] = load_iea_data(IEA_FILE, executor=pool)
+            loaded.update({source: future.result() for source, future in futures.items()})
+    return tuple(loaded[s] if s in loaded else empty_source(s) for s in ('IIASA', 'IEA', 'Ember', 'Ember (History)'))
+
+def region_rule(display_name, config, source):
+    """
+    How a display region is derived for a source: ('direct', code),
+    ('calc', (pos_codes, neg_codes)) or None.
+    IEA/IIASA prefer a direct code; Ember prefers its calculation and otherwise
+    falls back to the display name as the Ember area.
+    """
+    direct_key, calc_key = SOURCE_RULE_KEYS[source]
+    if source == 'Ember':
+        if calc_key in config: return 'calc', config[calc_key]
+        return 'direct', config.get(direct_key, display_name)
+    if direct_key in config: return 'direct', config[direct_key]
+    if calc_key in config:
+        pos_codes, neg_codes = config[calc_key]
+        if isinstance(pos_codes, str): pos_codes = [pos_codes]
+        return 'calc', (pos_codes, neg_codes)
+    return None
+
+def rule_codes(display_name, config, source):
+    # Every code a display region reads from a source (direct or in its calculation)
+    rule = region_rule(display_name, config, source)
+    if rule is None: return []
+    kind, codes = rule
+    if kind == 'direct': return [codes]
+    pos_codes, neg_codes = codes
+    if isinstance(pos_codes, str): pos_codes = [pos_codes]
+    return list(pos_codes) + list(neg_codes)
+
+def region_membership(raw, source, regions, direct_only=False):
+    """
+    Compile the REGION_CONFIG rules of the given display regions for a source into a
+    RegionMembership over the raw cube's codes (one row per display region) and a
+    per-row calculated flag.
+    """
+    terms, calc_rows = [], []
+    for display_name in regions:
+        rule = region_rule(display_name, REGION_CONFIG[display_name], source)
+        kind, codes = rule if rule else (None, None)
+        row_terms = []
+        if kind == 'direct':
+            if codes in raw.region_index: row_terms = [(raw.region_index[codes], 1)]
+        elif kind == 'calc' and not direct_only:
+            pos_codes, neg_codes = codes
+            row_terms = [(raw.region_index[c], 1) for c in pos_codes if c in raw.region_index]
+            row_terms += [(raw.region_index[c], -1) for c in neg_codes if c in raw.region_index]
+        terms.append(row_terms)
+        calc_rows.append(kind == 'calc')
+    return RegionMembership(terms), np.array(calc_rows)
+
+def map_regions(raw, cube, source, metric, cats, keep_cat=None, direct_only=False):
+    """
+    Fill cube[source, metric] for every display region of the cube from the code-level raw cube.
+    Direct regions copy their code (missing categories in a present year count as 0).
+    Calculated regions are sum(pos) - sum(neg) over the years any code has, clamped
+    at 0, and kept where keep_cat (or the sum of cats if None) is positive.
+    """
+    ci = raw.cats(cats)
+    membership, calc_rows = region_membership(raw, source, cube.regions, direct_only)
+    res, any_present = membership.aggregate(raw.view(source, metric)[..., ci], raw.present(source, metric))
+
+    # Ensure no negatives due to data mismatches (clamp to 0)
+    res[calc_rows] = np.maximum(res[calc_rows], 0)
+    keep_idx = cats.index(keep_cat) if keep_cat else None
+    keep_vals = res[..., keep_idx] if keep_idx is not None else res.sum(axis=-1)
+    keep = any_present & (~calc_rows[:, None] | (keep_vals > 0))
+
+    dst = cube.view(source, metric)
+    dst[..., ci] = np.where(keep[..., None], res, np.nan)
+
+def add_bio_residual(cube, source, metric):
+    # Calculate "Bio and other" as residual
+    data = cube.view(source, metric)
+    e, f, b, t = cube.cats(['electrons', 'fossil', 'bio', 'total'])
+    bio = np.maximum(data[..., t] - data[..., e] - data[..., f], 0)
+    data[..., b] = np.where(cube.present(source, metric), bio, np.nan)
+
+FACTOR_PROXY_REGION = 'OECD (1990 Members)'
+
+def efficiency_factors(cube, proxy=None):
+    """
+    Useful/Final ratio per display region, year and category from the IIASA-only
+    series, as a regions x years x FINAL_CATS array (1.0 where unknown).
+    Linear interpolation for gaps, constant extrapolation for the ends (1900-2023).
+    proxy: factors of FACTOR_PROXY_REGION (years x FINAL_CATS) when it is not in the cube.
+    """
+    final = np.nan_to_num(cube.view('IIASA', 'final')[..., cube.cats(FINAL_CATS)])
+    useful = np.nan_to_num(cube.view('IIASA', 'useful')[..., cube.cats(FINAL_CATS)])
+    factors = factor_series(final, useful, cube.year_array)
+
+    # For calculated regions without their own factors, use OECD-90 as proxy
+    calc_regions = [r for r in IIASA_CALC_REGIONS if r in cube.region_index]
+    if not calc_regions: return factors
+    if proxy is None: proxy = factors[cube.region_index[FACTOR_PROXY_REGION]]
+    for display_name in calc_regions:
+        region_factors = factors[cube.region_index[display_name]]
+        unset = region_factors == 1.0
+        region_factors[unset] = proxy[unset]
+    return factors
+
+def raw_cube(raw_iiasa, raw_iea, raw_ember, ember_history, regions=None):
+    """
+    Code-level EnergyCube of the raw stores, holding only the codes the rules of
+    the display regions read (default: all of REGION_CONFIG). Filled once per run
+    and shared by every display cube built from it.
+    The year axis always spans all raw stores, so each region comes out the same.
+    """
+    if regions is None: regions = REGION_CONFIG.keys()
+    needed = {code for r in regions for source in SOURCE_RULE_KEYS for code in rule_codes(r, REGION_CONFIG[r], source)}
+    years = year_range(raw_iea, raw_ember, ember_history, *raw_iiasa.values())
+    raw_codes = dict.fromkeys(code for store in (raw_iea, raw_ember, *raw_iiasa.values()) for code in store if code in needed)
+    raw = EnergyCube(raw_codes, years, SOURCES)
+    raw.fill_store(raw_iiasa['Final Energy'], 'IIASA', 'final')
+    raw.fill_store(raw_iiasa['Useful Energy'], 'IIASA', 'useful')
+    raw.fill_store(raw_iea, 'IEA', 'final')
+    raw.fill_store(raw_ember, 'Ember', 'power')
+    return raw
+
+def build_cube(raw, ember_history, regions=None):
+    """
+    raw_cube() -> display-level EnergyCube with the merged final, useful and
+    power series under the 'Merged' source.
+    regions limits the cube to those display regions (default: all of REGION_CONFIG);
+    the raw cube must hold their codes.
+    """
+    # Process into Display Names
+    if regions is None: regions = REGION_CONFIG.keys()
+    cube = EnergyCube(regions, raw.years, SOURCES + ['Merged'], origins=ORIGINS)
+    final_inputs = ['electrons', 'fossil', 'total']
+    map_regions(raw, cube, 'IIASA', 'final', final_inputs)
+    # Useful energy is only needed for the factors, i.e. for directly mapped regions
+    map_regions(raw, cube, 'IIASA', 'useful', final_inputs, direct_only=True)
+    map_regions(raw, cube, 'IEA', 'final', final_inputs)
+    map_regions(raw, cube, 'Ember', 'power', POWER_CATS + ['total'], keep_cat='total')
+    cube.fill_store(ember_history, 'Ember (History)', 'power')
+    for source, metric in (('IIASA', 'final'), ('IIASA', 'useful'), ('IEA', 'final')):
+        add_bio_residual(cube, source, metric)
+    return cube
+
+def merge_final(cube):
+    """
+    Pick IEA or IIASA for every region-year into cube['Merged', 'final'].
+    Returns the per-source counts.
+    """
+    e, f, b, t = cube.cats(['electrons', 'fossil', 'bio', 'total'])
+    iea, iiasa = cube.view('IEA', 'final'), cube.view('IIASA', 'final')
+    has_iea, has_iiasa = cube.present('IEA', 'final'), cube.present('IIASA', 'final')
+    years = cube.year_array[None, :]
+
+    # PRIORITIZE IEA DATA, BUT CHECK FOR COMPLETENESS (Bioenergy Gap)
+    # Condition 1: Bioenergy check. Must have Bioenergy (unless year >= 1990),
+    # unless IIASA also has none (a trusted 0)
+    iiasa_bio = has_iiasa & (iiasa[..., b] > 0)
+    bio_ok = ~(~((iea[..., b] > 0) | (years >= 1990)) & iiasa_bio)
+    # Condition 2: Fossil check (Must have some fossil energy if IIASA has it),
+    # to avoid "Electrons only" spikes like Other LAM 1971
+    fossil_ok = ~((iea[..., f] == 0) & has_iiasa & (iiasa[..., f] > 0))
+
+    use_iea = has_iea & bio_ok & fossil_ok
+    use_iiasa = ~use_iea & has_iiasa
+    source_counts = {'IEA': int(use_iea.sum()), 'IIASA': int(use_iiasa.sum())}
+
+    merged = cube.view('Merged', 'final')
+    chosen = np.where(use_iea[..., None], iea, iiasa)
+    total = chosen[..., e] + chosen[..., f] + chosen[..., b]
+    keep = (use_iea | use_iiasa) & (total > 0)
+    for c in (e, f, b):
+        merged[..., c] = np.where(keep, chosen[..., c], np.nan)
+    merged[..., t] = np.where(keep, total, np.nan)
+    cube.set_origin(keep & use_iea, 'final', 'IEA')
+    cube.set_origin(keep & use_iiasa, 'final', 'IIASA')
+    return source_counts
+
+def apply_useful(cube, factors):
+    # Apply the efficiency factors to the MERGED final energy (which might be IEA or IIASA)
+    fi = cube.cats(FINAL_CATS)
+    t = cube.cat_index['total']
+    final = cube.view('Merged', 'final')
+    has_final = cube.present('Merged', 'final')
+
+    useful_vals = round2(final[..., fi]) * factors
+    total_useful = useful_vals[..., 0] + useful_vals[..., 1] + useful_vals[..., 2]
+    ok = has_final & (total_useful > 0)
+    fallback = has_final & ~ok # Fallback to Final if 0
+
+    useful = cube.view('Merged', 'useful')
+    useful[..., fi] = np.where(ok[..., None], useful_vals, final[..., fi])
+    useful[..., t] = np.where(ok, total_useful, final[..., t])
+    useful[~(ok | fallback)] = np.nan
+    cube.origin[..., cube.metric_index['useful']] = cube.origin[..., cube.metric_index['final']]
+
+def merge_power(cube):
+    # Main Ember file first; the extended history only fills years it lacks
+    has_ember = cube.present('Ember', 'power')
+    has_history = ~has_ember & cube.present('Ember (History)', 'power')
+    merged = cube.view('Merged', 'power')
+    merged[has_ember] = cube.view('Ember', 'power')[has_ember]
+    merged[has_history] = cube.view('Ember (History)', 'power')[has_history]
+
+    calc_regions = np.array(['ember_calc' in REGION_CONFIG[r] for r in cube.regions])
+    cube.set_origin(has_ember & calc_regions[:, None], 'power', 'Ember (Calc)')
+    cube.set_origin(has_ember & ~calc_regions[:, None], 'power', 'Ember')
+    cube.set_origin(has_history, 'power', 'Ember (History)')
+
+# Output modes and their ternary categories
+MODE_CATS = {'final': FINAL_CATS, 'useful': FINAL_CATS, 'power': POWER_CATS}
+MODE_SOURCES = {'final': ['IEA', 'IIASA'], 'useful': ['IEA', 'IIASA'], 'power': ['Ember', 'Ember (History)']} # Inputs each mode needs
+OUTPUTS = ['html', 'json', 'packed', 'shards', 'csv', 'parquet', 'feather'] # The last three: long-format table (tidy_export)
+ARRAY_OUTPUTS = ['packed', 'shards', 'csv', 'parquet', 'feather'] # Written from the columns over all regions x years
+
+def merged_columns(cube):
+    """
+    Output arrays per mode from the 'Merged' series: (values, pcts, present, origin)
+    with values regions x years x (cats + total), pcts regions x years x cats.
+    Final/useful values are rounded to 2 decimals, power values are kept as is.
+    """
+    t = cube.cat_index['total']
+    columns = {}
+    for metric, cats in MODE_CATS.items():
+        data = cube.view('Merged', metric)
+        ci = cube.cats(cats)
+        values = round2(data[..., ci + [t]]) if metric != 'power' else data[..., ci + [t]]
+        origin = cube.origin[:, :, cube.metric_index[metric]]
+        columns[metric] = (values, percentages(data, ci, t), cube.present('Merged', metric), origin)
+    return columns
+
+MERGE_BATCH = 32 # Display regions merged per display cube, which bounds its memory as REGION_CONFIG grows
+
+def merge_regions(raw_iiasa, raw_iea, raw_ember, ember_history, regions, batch_size=MERGE_BATCH, source_counts=None):
+    """
+    Merge the display regions batch by batch (source selection, useful energy,
+    power) and yield (region, first_year, columns) per region, with its own span
+    of the merged_columns() arrays (see region_state.region_columns).
+    The code-level raw cube is filled once, with the codes of these regions only;
+    of the display cubes, only one batch's is alive at a time. source_counts (a
+    dict), if given, is incremented with the per-source counts of merge_final.
+    """
+    # Calculated IIASA regions fall back to the proxy's factors, whichever batch it is in
+    needs_proxy = any(r in IIASA_CALC_REGIONS for r in regions)
+    with stage('raw_cube') as metrics:
+        raw = raw_cube(raw_iiasa, raw_iea, raw_ember, ember_history,
+                       list(regions) + ([FACTOR_PROXY_REGION] if needs_proxy else []))
+        metrics.rows_out = len(raw.regions) * len(raw.years)
+    proxy = efficiency_factors(build_cube(raw, ember_history, [FACTOR_PROXY_REGION]))[0] if needs_proxy else None
+
+    for at in range(0, len(regions), batch_size):
+        with stage('build_cube') as metrics:
+            cube = build_cube(raw, ember_history, regions=regions[at:at + batch_size])
+            metrics.rows_out = len(cube.regions) * len(cube.years)
+
+        # Strategy: Calculate Efficiency Ratios from IIASA (Useful/Final) and apply to Merged Data
+        with stage('factor_interpolation') as metrics:
+            factors = efficiency_factors(cube, proxy)
+            metrics.rows_in = int(cube.present('IIASA', 'useful').sum())
+            metrics.rows_out = factors.shape[0] * factors.shape[1]
+
+        with stage('merge') as metrics:
+            counts = merge_final(cube)
+            # Calculate Useful Energy
+            apply_useful(cube, factors)
+            merge_power(cube)
+            computed = merged_columns(cube)
+            metrics.rows_in = len(cube.regions) * len(cube.years)
+            metrics.rows_out = int((computed['final'][2] | computed['power'][2]).sum())
+        if source_counts is not None:
+            for source, count in counts.items():
+                source_counts[source] = source_counts.get(source, 0) + count
+
+        for ri, region in enumerate(cube.regions):
+            yield (region, *region_state.region_columns(computed, ri, cube.years))
+
+def region_record(first_year, columns, origins, modes=MODE_CATS, year_span=None):
+    """
+    data.json years {year: {final: ..., useful: ..., power: ...}} of one region from
+    its own {mode: (values, pcts, present, origin)} columns starting at first_year
+    (see region_state.region_columns). Only the modes in `modes` and the years in
+    year_span (first, last) get records, as with select_output().
+    """
+    by_year = {}
+    if first_year is None: return by_year
+    n_years = len(next(iter(columns.values()))[2])
+    first, last = year_span or (first_year, first_year + n_years - 1)
+    for yi in range(max(0, first - first_year), min(n_years, last - first_year + 1)):
+        year = first_year + yi
+        entry = {}
+        for metric, cats in MODE_CATS.items():
+            values, pcts, present, origin = columns[metric]
+            if metric not in modes or not present[yi]:
+                entry[metric] = {}
+                continue
+            rec = dict(zip(cats + ['total'], values[yi].tolist()))
+            rec.update(zip([c + '_pct' for c in cats], pcts[yi].tolist()))
+            rec['source'] = origins[origin[yi]]
+            entry[metric] = rec
+        if any(entry.values()): # Useful only exists where final does
+            by_year[year] = entry
+    return by_year
+
+def merged_records(regions, years, columns, origins):
+    """
+    Yield the data.json items (country, {year: {final: ..., useful: ..., power: ...}})
+    one region at a time from the merged_columns() arrays over regions x years,
+    so the serializer never needs the whole structure in memory.
+    Final/useful values are rounded to 2 decimals, power values are kept as is.
+    """
+    for ri, region in enumerate(regions):
+        own = {metric: tuple(a[ri] for a in arrays) for metric, arrays in columns.items()}
+        by_year = region_record(years[0] if len(years) else None, own, origins)
+        if by_year: yield region, by_year
+
+# Incremental builds: per-region fingerprints and the columns they produced
+BUILD_VERSION = 1 # Bump when the merge logic changes, so every region is recomputed
+REGION_STATE_FILE = 'regions.npz'
+
+def region_inputs(display_name, raw_iiasa, raw_iea, raw_ember, ember_history):
+    # The config entry and raw store slices one display region is computed from
+    config = REGION_CONFIG[display_name]
+    inputs = {'config': config, 'history': ember_history.get(display_name)}
+    for source, stores in (('IEA', {'IEA': raw_iea}), ('IIASA', raw_iiasa), ('Ember', {'Ember': raw_ember})):
+        codes = rule_codes(display_name, config, source)
+        for part, store in stores.items():
+            inputs[part] = {code: store.get(code) for code in codes}
+    return inputs
+
+def region_fingerprints(raw_iiasa, raw_iea, raw_ember, ember_history, regions=None):
+    """
+    Fingerprint of every display region's output: its REGION_CONFIG entry, the raw
+    slices of every code its rules reference and the build settings. Calculated
+    IIASA regions also depend on the inputs of the efficiency factor proxy.
+    """
+    stores = (raw_iiasa, raw_iea, raw_ember, ember_history)
+    settings = [BUILD_VERSION, ORIGINS, MODE_CATS]
+    proxy = region_inputs(FACTOR_PROXY_REGION, *stores)
+    fingerprints = {}
+    for display_name in regions or REGION_CONFIG:
+        inputs = region_inputs(display_name, *stores)
+        if display_name in IIASA_CALC_REGIONS: inputs['proxy'] = proxy
+        fingerprints[display_name] = region_state.fingerprint([settings, inputs])
+    return fingerprints
+
+def stale_regions(fingerprints, state):
+    # Regions (in the order of fingerprints, i.e. the run's) whose fingerprint differs from the stored one
+    return [r for r, fp in fingerprints.items() if r not in state or state[r]['fingerprint'] != fp]
+
+# Content-hashed data file referenced by the HTML in 'external' mode
+HASH_LENGTH = 12
+HASHED_DATA_PATTERN = re.compile(r'data\.[0-9a-f]{%d}\.json' % HASH_LENGTH)
+HASHED_DATA_TMP = 'data.hashing.tmp'
+HASHED_DATA_KEEP = 2 # Older hashed copies kept, as pages cached from earlier builds still reference them
+
+def store_hashed_data(directory, tmp_path, digest):
+    # Move the written data to data.<hash>.json (an existing copy of the same hash is kept as is) and drop
+    # all but the HASHED_DATA_KEEP newest other hashed copies by mtime; returns the file name
+    name = f'data.{digest[:HASH_LENGTH]}.json'
+    target = os.path.join(directory, name)
+    if os.path.exists(target): os.remove(tmp_path)
+    else: os.replace(tmp_path, target)
+    older = [os.path.join(directory, old) for old in os.listdir(directory or '.')
+             if HASHED_DATA_PATTERN.fullmatch(old) and old != name]
+    for path in sorted(older, key=os.path.getmtime, reverse=True)[HASHED_DATA_KEEP:]:
+        os.remove(path)
+    return name
+
+def select_output(columns, years, modes, year_span=None):
+    """
+    Limit output columns to the years in year_span (first, last) and mark the modes
+    not in `modes` as having no records. Returns (years, columns).
+    """
+    first, last = year_span or (years[0] if years else 0, years[-1] if years else 0)
+    keep = slice(sum(y < first for y in years), sum(y <= last for y in years))
+    selected = {}
+    for mode, (values, pcts, present, origin) in columns.items():
+        present = present[:, keep] if mode in modes else np.zeros_like(present[:, keep])
+        selected[mode] = (values[:, keep], pcts[:, keep], present, origin[:, keep])
+    return years[keep], selected
+
+def main(jobs=DEFAULT_JOBS, html_data=HTML_DATA, incremental=INCREMENTAL,
+         regions=None, year_span=None, modes=None, outputs=None):
+    """
+    Build the outputs. regions (display names), year_span (first, last) and modes
+    (keys of MODE_CATS) limit what they contain; only the inputs the modes need are
+    read, e.g. modes=['power'] skips WORLDBAL and IIASA. outputs picks from OUTPUTS.
+    """
+    global RUN_ID
+    RUN_ID = f"{time.strftime('%Y-%m-%dT%H:%M:%S')}-{os.getpid()}"
+    regions = list(regions or REGION_CONFIG)
+    modes = list(modes or MODE_CATS)
+    outputs = list(outputs or OUTPUTS)
+    sources = {source for mode in modes for source in MODE_SOURCES[mode]}
+    raw_iiasa, raw_iea, raw_ember, ember_history = load_sources(jobs, sources)
+    years = year_range(raw_iea, raw_ember, ember_history, *raw_iiasa.values())
+
+    # Regions whose inputs are unchanged since the last run are taken from the saved state
+    fingerprints = region_fingerprints(raw_iiasa, raw_iea, raw_ember, ember_history, regions)
+    # Only full-mode runs use the state: the inputs skipped for other modes come back empty, so
+    # their fingerprints would never match and saving would overwrite the state with empty columns
+    full_modes = set(modes) == set(MODE_CATS)
+    state_path = os.path.join(CACHE_DIR, REGION_STATE_FILE) if incremental and CACHE_DIR and full_modes else None
+    state = region_state.load_state(state_path) if state_path else {}
+    stale = stale_regions(fingerprints, state)
+    if state:
+        print(f"\nRecomputing {len(stale)} of {len(regions)} regions: {', '.join(stale) or 'none'}")
+
+    source_counts = {}
+    def region_entries():
+        # (region, first_year, columns) of every region in order, merged if stale and else from the state.
+        # Merged regions go into the state only when it is saved, which happens once all are through
+        if stale: print("\nMerging datasets and calculating Useful Energy...")
+        merged = merge_regions(raw_iiasa, raw_iea, raw_ember, ember_history, stale, source_counts=source_counts)
+        recompute = set(stale)
+        for region in regions:
+            if region in recompute:
+                _, first_year, own_columns = next(merged)
+                if state_path:
+                    state[region] = {'fingerprint': fingerprints[region], 'first_year': first_year, 'columns': own_columns}
+            else:
+                first_year, own_columns = state[region]['first_year'], state[region]['columns']
+            yield region, first_year, own_columns
+        # Drops regions no longer configured, keeps those outside this run's selection
+        if state_path: region_state.save_state(state_path, {r: state[r] for r in REGION_CONFIG if r in state})
+
+    # The HTML and data.json take the records region by region straight from the merge; the other
+    # outputs need the columns over all regions x years, which are filled from the same stream
+    streamed = not any(output in outputs for output in ARRAY_OUTPUTS)
+    if streamed:
+        columns, counts = None, {'records': 0}
+    else:
+        columns = region_state.assemble_columns(region_entries(), regions, years, MODE_CATS)
+        years, columns = select_output(columns, years, modes, year_span)
+        # Region-years with a record in any selected mode, i.e. the data.json records
+        n_records = int(np.logical_or.reduce([columns[mode][2] for mode in modes]).sum())
+        print(f"Generated {n_records} merged records.")
+
+    def streamed_records():
+        # data.json items of region_entries(), counting the region-years in counts['records']
+        for region, first_year, own_columns in region_entries():
+            by_year = region_record(first_year, own_columns, ORIGINS, modes, year_span)
+            counts['records'] += len(by_year)
+            if by_year: yield region, by_year
 
     # HTML Template (Reverting to original design + small Toggle)
     html_template = """<!DOCTYPE html>
@@ -1073,7 +1199,8 @@ def main():
 
     <script>
         const COUNTRY_CONFIG = %COUNTRIES%;
-        const RAW_DATA = %DATA%;
+        const DATA_URL = %DATA_URL%; // External data file, or null when RAW_DATA is embedded
+        let RAW_DATA = %DATA%;
         
         let selectedCountries = new Set(['United States', 'China', 'Germany', 'India', 'Brazil', 'World']);
         let currentYear = 2023;
@@ -1392,31 +1519,101 @@ def main():
             if (isPlaying) { playBtn.click(); playBtn.click(); }
         }
 
-        drawTriangle(); renderList(); updateUI();
+        drawTriangle(); renderList();
+        if (DATA_URL) fetch(DATA_URL).then(r => r.json()).then(data => { RAW_DATA = data; updateUI(); });
+        else updateUI();
     </script>
 </body>
 </html>"""
 
     # Prepare config for JS
-    js_config = {k: {'color': v['color'], 'short': v['short']} for k, v in REGION_CONFIG.items()}
+    js_config = {k: {'color': REGION_CONFIG[k]['color'], 'short': REGION_CONFIG[k]['short']} for k in regions}
     
-    print(f"Generated {len(results)} data records with Final and Useful energy.")
-    print(f"Source breakdown: {dict(source_counts)}")
-
-    # Inject data (combined_data is the new structure)
-    # Convert defaultdict to regular dict for JSON serialization
-    json_data = json.loads(json.dumps(combined_data))
-    
-    final_html = html_template.replace('%COUNTRIES%', json.dumps(js_config)).replace('%DATA%', json.dumps(json_data))
-    
-    with open(OUTPUT_HTML, 'w') as f:
-        f.write(final_html)
-    print(f"Saved exact replica visualization to {OUTPUT_HTML}")
-
-    # Also save to data.json for the main app
-    with open(OUTPUT_JSON, 'w') as f:
-        json.dump(json_data, f)
-    print(f"Saved merged data to {OUTPUT_JSON}")
+    def print_counts():
+        print(f"Generated {n_records} data records ({', '.join(modes)}).")
+        print(f"Source breakdown{' (recomputed regions)' if len(stale) < len(regions) else ''}: {source_counts}")
+    if not streamed: print_counts()
+
+    # Stream the data once, straight into every output that carries it
+    html_template = html_template.replace('%COUNTRIES%', json.dumps(js_config))
+    html_dir = os.path.dirname(OUTPUT_HTML)
+
+    if 'html' in outputs or 'json' in outputs:
+        with stage('serialization') as metrics:
+            # Generated region by region while streaming
+            records = streamed_records() if streamed else merged_records(regions, years, columns, ORIGINS)
+            if not streamed:
+                metrics.rows_in = n_records
+                metrics.rows_out = int(np.logical_or.reduce([present for _, _, present, _ in columns.values()]).sum())
+            external = 'html' in outputs and html_data == 'external'
+            with ExitStack() as files:
+                writers = []
+                if 'json' in outputs: writers.append(files.enter_context(open(OUTPUT_JSON, 'wb')).write)
+                if external:
+                    # The HTML references a content-hashed copy of the data, so it only changes
+                    # with the template and the data file can be cached indefinitely
+                    hasher = hashlib.sha256()
+                    tmp_path = os.path.join(html_dir, HASHED_DATA_TMP)
+                    writers += [files.enter_context(open(tmp_path, 'wb')).write, hasher.update]
+                elif 'html' in outputs:
+                    prefix, suffix = html_template.replace('%DATA_URL%', 'null').split('%DATA%')
+                    html = files.enter_context(open(OUTPUT_HTML, 'wb'))
+                    html.write(prefix.encode('utf-8'))
+                    writers.append(html.write)
+                stream_json(records, writers)
+                if 'html' in outputs and not external: html.write(suffix.encode('utf-8'))
+            if external:
+                data_file = store_hashed_data(html_dir, tmp_path, hasher.hexdigest())
+                print(f"Saved data for the visualization to {data_file}")
+                with open(OUTPUT_HTML, 'w', encoding='utf-8') as f:
+                    f.write(html_template.replace('%DATA_URL%', json.dumps(data_file)).replace('%DATA%', '{}'))
+            if streamed: # Counted while the merge ran inside this stage
+                n_records = metrics.rows_in = metrics.rows_out = counts['records']
+            if 'json' in outputs: metrics.info['json_bytes'] = os.path.getsize(OUTPUT_JSON)
+        if 'html' in outputs: print(f"Saved exact replica visualization to {OUTPUT_HTML}")
+        # data.json is the same data for the main app
+        if 'json' in outputs: print(f"Saved merged data to {OUTPUT_JSON}")
+    if streamed: print_counts()
+
+    tidy_formats = [fmt for fmt in TIDY_FORMATS if fmt in outputs]
+    if tidy_formats:
+        with stage('tidy_export') as metrics:
+            # Long-format table of the same records for notebooks
+            table = tidy_table(regions, years, columns, MODE_CATS, ORIGINS)
+            metrics.rows_in, metrics.rows_out = n_records, len(table)
+            for fmt, path in write_tidy(OUTPUT_JSON, table, tidy_formats).items():
+                metrics.info[f'{fmt}_bytes'] = os.path.getsize(path)
+                print(f"Saved the long-format table ({len(table):,} rows) to {path}")
+
+    lod = None
+    if TRAIL_LOD and ('packed' in outputs or 'shards' in outputs):
+        with stage('trail_lod') as metrics:
+            # Simplified trails at every tolerance, stored next to the full ones
+            lod = trail_lods(regions, years, columns, MODE_CATS, LOD_TOLERANCES)
+            kept = [levels for modes in lod['regions'].values() for kinds in modes.values() for levels in kinds.values()]
+            # Trail and smoothed trail points per level, before and after simplification
+            metrics.rows_in = sum(int(columns[mode][2].sum()) for mode in MODE_CATS) * 2 * len(LOD_TOLERANCES)
+            metrics.rows_out = sum(len(idx) for levels in kept for idx in levels)
+            metrics.info['tolerances'] = LOD_TOLERANCES
+
+    if 'packed' in outputs or 'shards' in outputs:
+        with stage('packing') as metrics:
+            metrics.rows_in, metrics.rows_out = n_records, len(regions)
+            if 'packed' in outputs:
+                # Compact typed-array version of the same data for the web app
+                bin_path, manifest_path = write_packed(OUTPUT_JSON, regions, years, columns, MODE_CATS, ORIGINS, lod)
+                metrics.info['bin_bytes'] = os.path.getsize(bin_path)
+                print(f"Saved packed data to {bin_path} ({os.path.getsize(bin_path):,} bytes) and {manifest_path}")
+            if 'shards' in outputs:
+                # Per-region shards of the packed data, fetched lazily by the web app
+                shard_dir, index_path = write_shards(OUTPUT_JSON, regions, years, columns, MODE_CATS, ORIGINS, js_config, lod)
+                print(f"Saved {len(os.listdir(shard_dir))} region shards to {shard_dir} and their index to {index_path}")
+
+    if STAGE_REPORT and os.path.exists(STAGE_REPORT):
+        print(f"\nStage metrics (appended to {STAGE_REPORT}):")
+        print(stage_metrics.format_report(stage_metrics.read_report(STAGE_REPORT, RUN_ID)))
 
 if __name__ == '__main__':
-    main()
+    # Same options as `python -m ternary build`
+    from ternary.__main__ import main as cli
+    sys.exit(cli(['build'] + sys.argv[1:]))
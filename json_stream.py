@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON output for the merged data.
+The {region: {year: ...}} structure is serialised one region at a time and each
+chunk is handed to every output at once (data.json, the HTML, a hash), so the
+data is walked once and the full JSON text never has to be held in memory.
+orjson is used when installed (much faster, compact separators, NaN as null);
+otherwise the stdlib json module, whose output matches json.dumps(data).
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps_stdlib(value):
+    return json.dumps(value).encode('utf-8')
+
+def _dumps_orjson(value):
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+def json_chunks(items, backend=None):
+    """
+    Yield the JSON text of a dict as UTF-8 chunks, one per (key, value) pair of
+    items (e.g. data.items() or a generator of regions).
+    backend: 'orjson' or 'json' (default: orjson if installed).
+    """
+    if backend is None: backend = 'orjson' if orjson is not None else 'json'
+    dumps = _dumps_orjson if backend == 'orjson' else _dumps_stdlib
+    item_sep, key_sep = (b',', b':') if backend == 'orjson' else (b', ', b': ')
+
+    yield b'{'
+    for i, (key, value) in enumerate(items):
+        yield (item_sep if i else b'') + dumps(str(key)) + key_sep + dumps(value)
+    yield b'}'
+
+def stream_json(items, writers, backend=None):
+    # Write the JSON of items to every writer (callables taking bytes, e.g. f.write)
+    for chunk in json_chunks(items, backend):
+        for write in writers:
+            write(chunk)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Compact binary form of the merged data for the web app.
+The .bin file holds one block per region covering its contiguous span of years.
+Inside a block every mode has a float32 array of values (year x field), its
+percentages as uint16 fixed point (pct * 100, so exact for the 2-decimal values)
+and a uint8 source index per year. The small JSON manifest names the fields once
+and gives the byte offset of every array, so the browser reads them straight out
+of the buffer (see decodeRegion in app.js). All arrays are little-endian.
+Every mode also carries its ternary geometry (see ternary_geometry): the unit
+triangle point per year (NaN without a record), the trail of those points with
+its smoothed variant, and per year the trail length up to it (uint16), so the
+browser slices the trails instead of projecting every year on every frame.
+Optionally the trails also come simplified at a few tolerances (level of detail,
+see trail_lods): per level the uint16 indices of the trail points kept, so the
+browser can draw fewer vertices when the chart is small.
+The same blocks are also written one file per region (shards) with an index, so
+the web app can fetch only the regions it shows.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+from ternary_geometry import CORNERS, CORNER_CATS, mode_xy, trail_geometry, trail_lod
+
+PACK_FORMAT = 2
+NO_RECORD = 255 # Source index of a year without a record for the mode
+PCT_SCALE = 100
+PCT_MISSING = 65535 # uint16 percentage that was NaN or infinite (total of 0)
+SHARD_DIR = 'shards'
+
+def packed_paths(json_path):
+    # data.json -> (data.bin, data.manifest.json)
+    base = os.path.splitext(json_path)[0]
+    return base + '.bin', base + '.manifest.json'
+
+def _pct_type(pcts):
+    # uint16 fixed point if every percentage fits, else float32
+    finite = pcts[np.isfinite(pcts)]
+    fits = finite.size == 0 or (finite.min() >= 0 and finite.max() * PCT_SCALE < PCT_MISSING)
+    return 'uint16' if fits else 'float32'
+
+def _encode_pcts(pcts, pct_type):
+    if pct_type == 'float32': return pcts.astype('<f4')
+    scaled = np.where(np.isfinite(pcts), np.rint(pcts * PCT_SCALE), PCT_MISSING)
+    return scaled.astype('<u2')
+
+def trail_lods(regions, years, columns, mode_cats, tolerances):
+    """
+    Simplified trails of every region and mode from the output columns:
+    {'tolerances': [...], 'regions': {region: {mode: {'trail': [kept indices per
+    level], 'smooth': [...]}}}}, indices into the trails pack_regions writes.
+    """
+    lod = {'tolerances': list(tolerances), 'regions': {}}
+    for ri, region in enumerate(regions):
+        lod['regions'][region] = {}
+        for mode, cats in mode_cats.items():
+            _, pcts, present, _ = columns[mode]
+            xy = mode_xy(pcts[ri], cats, mode)
+            trail, smooth, _, trail_start = trail_geometry(years, xy, present[ri], mode)
+            lod['regions'][region][mode] = {'trail': trail_lod(trail, trail_start, tolerances),
+                                            'smooth': trail_lod(smooth, trail_start, tolerances)}
+    return lod
+
+def pack_regions(regions, years, columns, mode_cats, origins, lod=None):
+    """
+    Build (manifest, {region: block bytes}) from per-mode output columns
+    {mode: (values, pcts, present, origin)} as returned by merged_columns(), plus
+    the simplified trails from trail_lods() if given.
+    Array offsets in the manifest are relative to the start of the region's block.
+    A year is kept if it has a record in any mode, like data.json.
+    """
+    years = np.asarray(years)
+    pct_types = {mode: _pct_type(columns[mode][1]) for mode in mode_cats}
+    manifest = {
+        'format': PACK_FORMAT,
+        'sources': list(origins),
+        'modes': {mode: {'values': cats + ['total'], 'pcts': [c + '_pct' for c in cats], 'pct_type': pct_types[mode]}
+                  for mode, cats in mode_cats.items()},
+        'geometry': {'corners': {k: list(v) for k, v in CORNERS.items()}, 'corner_cats': CORNER_CATS},
+        'regions': {},
+    }
+    if lod: manifest['geometry']['lod_tolerances'] = lod['tolerances']
+    blocks = {}
+
+    kept = np.logical_or.reduce([columns[mode][2] for mode in mode_cats]) # regions x years
+    for ri, region in enumerate(regions):
+        year_idx = np.flatnonzero(kept[ri])
+        if not len(year_idx): continue
+        span = slice(year_idx[0], year_idx[-1] + 1)
+        spec = {'first_year': int(years[span][0]), 'last_year': int(years[span][-1]),
+                'years': int(span.stop - span.start), 'modes': {}}
+
+        chunks, offset = [], 0
+        def add(array):
+            nonlocal offset
+            at = offset
+            data = array.tobytes()
+            chunks.append(data)
+            offset += len(data)
+            return at
+
+        # float32 first, then uint16, then uint8 keeps every array aligned
+        arrays, shapes = {}, {}
+        for mode, cats in mode_cats.items():
+            values, pcts, present, origin = columns[mode]
+            has = present[ri, span] & kept[ri, span]
+            sources = np.where(has, origin[ri, span], NO_RECORD).astype(np.uint8)
+            xy = np.where(has[:, None], mode_xy(pcts[ri, span], cats, mode), np.nan)
+            trail, smooth, trail_end, trail_start = trail_geometry(years[span], xy, has, mode)
+            shapes[mode] = {'points': len(trail), 'trail_start': trail_start}
+            arrays[mode] = (values[ri, span].astype('<f4'), _encode_pcts(pcts[ri, span], pct_types[mode]), sources,
+                            {'xy': xy.astype('<f4'), 'trail': trail.astype('<f4'), 'smooth': smooth.astype('<f4')},
+                            trail_end.astype('<u2'))
+        for mode, (values, _, _, geometry, _) in arrays.items():
+            spec['modes'][mode] = {'values': add(values)}
+            spec['modes'][mode].update({name: add(array) for name, array in geometry.items()}, **shapes[mode])
+        for dtype in ('float32', 'uint16'):
+            for mode, (_, pcts, _, _, _) in arrays.items():
+                if pct_types[mode] == dtype: spec['modes'][mode]['pcts'] = add(pcts)
+        for mode, (_, _, _, _, trail_end) in arrays.items():
+            spec['modes'][mode]['trail_end'] = add(trail_end)
+            if lod:
+                levels = lod['regions'][region][mode]
+                spec['modes'][mode]['lod'] = [
+                    {'trail': add(t.astype('<u2')), 'trail_points': len(t), 'smooth': add(m.astype('<u2')), 'smooth_points': len(m)}
+                    for t, m in zip(levels['trail'], levels['smooth'])]
+        for mode, (_, _, sources, _, _) in arrays.items():
+            spec['modes'][mode]['sources'] = add(sources)
+        add(np.zeros(-offset % 4, dtype=np.uint8)) # Blocks stay 4-byte aligned when concatenated
+        manifest['regions'][region] = spec
+        blocks[region] = b''.join(chunks)
+
+    return manifest, blocks
+
+def write_packed(json_path, regions, years, columns, mode_cats, origins, lod=None):
+    # Write all blocks as one .bin payload plus its manifest next to json_path
+    bin_path, manifest_path = packed_paths(json_path)
+    manifest, blocks = pack_regions(regions, years, columns, mode_cats, origins, lod)
+    manifest['file'] = os.path.basename(bin_path)
+    offset = 0
+    with open(bin_path, 'wb') as f:
+        for region, block in blocks.items():
+            f.write(block)
+            manifest['regions'][region].update(offset=offset, length=len(block))
+            offset += len(block)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    return bin_path, manifest_path
+
+def shard_name(region):
+    # 'Asia (Total)' -> 'asia-total.bin'
+    return re.sub(r'[^a-z0-9]+', '-', region.lower()).strip('-') + '.bin'
+
+def write_shards(json_path, regions, years, columns, mode_cats, origins, region_info, lod=None):
+    """
+    Write one block file per region into shards/ next to json_path, plus an index
+    (<name>.index.json) with the field layout and, per region, its shard, year
+    range and display info from region_info (e.g. color, short). The web app only
+    fetches the shards of the regions it shows.
+    """
+    shard_dir = os.path.join(os.path.dirname(json_path), SHARD_DIR)
+    index_path = os.path.splitext(json_path)[0] + '.index.json'
+    os.makedirs(shard_dir, exist_ok=True)
+    index, blocks = pack_regions(regions, years, columns, mode_cats, origins, lod)
+    names = {region: shard_name(region) for region in blocks}
+    if len(set(names.values())) != len(names):
+        raise ValueError(f"Regions share a shard file name: {names}")
+    for region, block in blocks.items():
+        name = names[region]
+        with open(os.path.join(shard_dir, name), 'wb') as f:
+            f.write(block)
+        index['regions'][region].update(region_info.get(region, {}), file=f'{SHARD_DIR}/{name}')
+
+    # Drop shards of regions that are no longer produced
+    for name in os.listdir(shard_dir):
+        if name.endswith('.bin') and name not in names.values():
+            os.remove(os.path.join(shard_dir, name))
+
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return shard_dir, index_path
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+On-disk cache for the parsed raw stores (raw_iea, raw_iiasa, raw_ember_by_area).
+Stores parsed from the same source are written together as one long-format .npz
+file keyed by the size, mtime and content hash of the source, so later runs skip
+the reparse. Smaller derived values (e.g. the WORLDBAL country index) and derived
+files (e.g. the converted Ember workbook) use the same keys in a JSON file.
+"""
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+from functools import partial
+
+import numpy as np
+
+CACHE_VERSION = 2 # Bump when a parser changes what ends up in a store
+HASH_BLOCK = 8 * 1024 * 1024
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def file_stat(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+def new_store():
+    # Region -> Year -> Category -> Value (partials rather than lambdas keep it picklable)
+    return defaultdict(partial(defaultdict, partial(defaultdict, float)))
+
+def flatten_stores(stores):
+    # Long format columns in insertion order, so a reload iterates identically
+    parts, regions, years, cats, values = [], [], [], [], []
+    for part, store in stores.items():
+        for region, by_year in store.items():
+            for year, by_cat in by_year.items():
+                for cat, value in by_cat.items():
+                    parts.append(part)
+                    regions.append(region)
+                    years.append(year)
+                    cats.append(cat)
+                    values.append(value)
+    return parts, regions, years, cats, values
+
+def unflatten_stores(part_names, parts, regions, years, cats, values):
+    stores = {part: new_store() for part in part_names}
+    for part, region, year, cat, value in zip(parts, regions, years, cats, values):
+        stores[part][region][year][cat] = value
+    return stores
+
+def _encode(labels):
+    uniques = list(dict.fromkeys(labels))
+    index = {v: i for i, v in enumerate(uniques)}
+    return np.array(uniques, dtype=str), np.array([index[v] for v in labels], dtype=np.int32)
+
+def save_stores(path, stores, key):
+    parts, regions, years, cats, values = flatten_stores(stores)
+    part_labels, part_idx = _encode(parts)
+    region_labels, region_idx = _encode(regions)
+    cat_labels, cat_idx = _encode(cats)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, key=np.array(json.dumps(key)),
+                        part_names=np.array(list(stores), dtype=str),
+                        part_labels=part_labels, part=part_idx,
+                        region_labels=region_labels, region=region_idx,
+                        cat_labels=cat_labels, cat=cat_idx,
+                        year=np.array(years, dtype=np.int32),
+                        value=np.array(values, dtype=np.float64))
+    os.replace(tmp_path, path)
+
+def load_stores(path):
+    # Returns (key, stores) or (None, None) if the file is missing or unreadable
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            key = json.loads(str(npz['key']))
+            parts = npz['part_labels'][npz['part']].tolist()
+            regions = npz['region_labels'][npz['region']].tolist()
+            cats = npz['cat_labels'][npz['cat']].tolist()
+            stores = unflatten_stores(npz['part_names'].tolist(), parts, regions,
+                                      npz['year'].tolist(), cats, npz['value'].tolist())
+            return key, stores
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def load_json(path):
+    # Returns (key, value) or (None, None) if the file is missing or unreadable
+    try:
+        with open(path, encoding='utf-8') as f:
+            cached = json.load(f)
+        return cached['key'], cached['value']
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def save_json(path, value, key):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'key': key, 'value': value}, f)
+    os.replace(tmp_path, path)
+
+def cached_value(path, name, sources, params, build, load, save):
+    """
+    Return the value cached at path, calling build() only if the sources or params
+    changed. load(path) gives (key, value) or (None, None); save(path, value, key)
+    writes it. Sources whose size and mtime match the cache are trusted without
+    hashing; otherwise the content hash decides (e.g. a file that was copied or
+    touched).
+    """
+    params = json.loads(json.dumps(params)) # Compare in the same form as stored
+    stats = [file_stat(p) for p in sources]
+    cached_key, value = load(path)
+
+    if cached_key and cached_key['version'] == CACHE_VERSION and cached_key['params'] == params:
+        cached_sources = cached_key['sources']
+        if [{k: v for k, v in s.items() if k != 'hash'} for s in cached_sources] == stats:
+            print(f"  Loaded {name} from cache")
+            return value
+        hashes = [file_hash(p) for p in sources]
+        if [s['hash'] for s in cached_sources] == hashes:
+            print(f"  Loaded {name} from cache (sources touched but unchanged)")
+            save(path, value, _make_key(stats, hashes, params))
+            return value
+    else:
+        hashes = None
+
+    value = build()
+    if hashes is None: hashes = [file_hash(p) for p in sources]
+    save(path, value, _make_key(stats, hashes, params))
+    return value
+
+def cached_file(cache_dir, filename, sources, params, write):
+    """
+    Path of a file derived from the sources (e.g. a filtered or converted copy),
+    calling write(path) only if the sources or params changed. The key is kept next
+    to it in <filename>.json, together with whatever write() returned.
+    """
+    path = os.path.join(cache_dir, filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    def load(key_path):
+        return load_json(key_path) if os.path.exists(path) else (None, None)
+    cached_value(path + '.json', filename, sources, params, lambda: write(path), load, save_json)
+    return path
+
+def cached_stores(cache_dir, name, sources, params, build):
+    # Stores cached under `name` ({part: store}) as a long-format .npz
+    path = os.path.join(cache_dir, f'{name}.npz')
+    return cached_value(path, name, sources, params, build, load_stores, save_stores)
+
+def cached_json(cache_dir, name, sources, params, build):
+    # Same for a small JSON-serialisable value
+    path = os.path.join(cache_dir, f'{name}.json')
+    return cached_value(path, name, sources, params, build, load_json, save_json)
+
+def _make_key(stats, hashes, params):
+    sources = [dict(s, hash=h) for s, h in zip(stats, hashes)]
+    return {'version': CACHE_VERSION, 'params': params, 'sources': sources}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Per-region build state for incremental runs.
+Every display region's output columns are stored with a fingerprint of everything
+they were computed from (its REGION_CONFIG entry, the raw store slices of the codes
+it references, the build version). A later run only recomputes the regions whose
+fingerprint changed and takes the others from here.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+COLUMN_FIELDS = ('values', 'pcts', 'present', 'origin')
+
+def fingerprint(inputs):
+    # Content hash of a JSON-serialisable structure (dict keys are sorted, floats exact)
+    text = json.dumps(inputs, sort_keys=True, default=list)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def region_columns(columns, ri, years):
+    """
+    Cut one region out of full {mode: (values, pcts, present, origin)} columns,
+    keeping only its span of years with any record. Returns (first_year, columns)
+    or (None, {}) for a region without records.
+    """
+    has = np.zeros(len(years), dtype=bool)
+    for _, _, present, _ in columns.values():
+        has |= present[ri]
+    year_idx = np.flatnonzero(has)
+    if not len(year_idx): return None, {}
+    span = slice(year_idx[0], year_idx[-1] + 1)
+    return int(years[span.start]), {mode: tuple(a[ri, span] for a in arrays) for mode, arrays in columns.items()}
+
+def assemble_columns(entries, regions, years, mode_cats):
+    """
+    Full {mode: (values, pcts, present, origin)} columns over regions x years from
+    (region, first_year, columns) entries as region_columns() cuts them, filled as
+    they come so the entries need not be kept. Years outside a region's span and
+    regions without an entry have no record.
+    """
+    shape = (len(regions), len(years))
+    columns = {}
+    for mode, cats in mode_cats.items():
+        columns[mode] = (np.full(shape + (len(cats) + 1,), np.nan), np.full(shape + (len(cats),), np.nan),
+                         np.zeros(shape, dtype=bool), np.full(shape, -1, dtype=np.int8))
+    row = {region: ri for ri, region in enumerate(regions)}
+    for region, first_year, stored_columns in entries:
+        if first_year is None: continue
+        for mode, stored in stored_columns.items():
+            start = first_year - years[0]
+            at = slice(start, start + len(stored[0]))
+            for dst, src in zip(columns[mode], stored):
+                dst[row[region], at] = src
+    return columns
+
+def load_state(path):
+    # {region: {'fingerprint', 'first_year', 'columns'}}, empty if missing or unreadable
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            index = json.loads(str(npz['index']))
+            state = {}
+            for i, entry in enumerate(index):
+                columns = {mode: tuple(npz[f'{i}/{mode}/{field}'] for field in COLUMN_FIELDS)
+                           for mode in entry['modes']}
+                state[entry['region']] = {'fingerprint': entry['fingerprint'],
+                                          'first_year': entry['first_year'], 'columns': columns}
+            return state
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def save_state(path, state):
+    index, arrays = [], {}
+    for i, (region, entry) in enumerate(state.items()):
+        index.append({'region': region, 'fingerprint': entry['fingerprint'],
+                      'first_year': entry['first_year'], 'modes': list(entry['columns'])})
+        for mode, stored in entry['columns'].items():
+            for field, array in zip(COLUMN_FIELDS, stored):
+                arrays[f'{i}/{mode}/{field}'] = array
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, index=np.array(json.dumps(index)), **arrays)
+    os.replace(tmp_path, path)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Timing and memory metrics for the pipeline stages.
+Every stage appends one JSON line to a report file: wall and CPU time, the peak
+RSS of the process so far and the rows going in and out. Stages that run in the
+loader processes report from there (pid tells them apart), and CPU time only
+counts the process the stage ran in. Optionally every stage also runs under
+cProfile and leaves a <stage>.<run>.<pid>.<n>.prof file, unique across runs,
+processes and repeated stages (read it with pstats or snakeviz).
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+_profile_count = itertools.count() # Numbers the profiles of this process
+_profiling = [] # Stage being profiled in this process (cProfile allows one at a time)
+
+def peak_rss_mb():
+    # High-water mark of this process's resident memory, or None where unknown
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1) # bytes on macOS, KiB on Linux
+
+class Stage:
+    # Filled in by the stage body: rows_in/rows_out and any extra fields for the report.
+    # record holds the finished report record once the stage is over
+    def __init__(self, name):
+        self.name = name
+        self.rows_in = None
+        self.rows_out = None
+        self.info = {}
+        self.record = None
+
+@contextmanager
+def stage(name, report=None, profile_dir=None, run=None):
+    """
+    Measure the with-block as stage `name` and append its record to report (a
+    JSON-lines path; None only measures). Yields the Stage to set the row counts on.
+    A stage nested in a profiled one is measured but not profiled separately: it is
+    part of the outer stage's profile (cProfile allows one profiler at a time).
+    """
+    current = Stage(name)
+    profiler = cProfile.Profile() if profile_dir and not _profiling else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler:
+        _profiling.append(name)
+        profiler.enable()
+    try:
+        yield current
+    finally:
+        if profiler:
+            profiler.disable()
+            _profiling.pop()
+        record = {'run': run, 'stage': name, 'pid': os.getpid(),
+                  'wall_s': round(time.perf_counter() - wall, 4), 'cpu_s': round(time.process_time() - cpu, 4),
+                  'peak_rss_mb': peak_rss_mb(), 'rows_in': current.rows_in, 'rows_out': current.rows_out}
+        record.update(current.info)
+        current.record = record
+        if profiler:
+            os.makedirs(profile_dir, exist_ok=True)
+            tag = re.sub(r'[^\w.-]', '-', str(run)) # Run ids hold ':', which Windows file names cannot
+            record['profile'] = os.path.join(profile_dir, f'{name}.{tag}.{record["pid"]}.{next(_profile_count)}.prof')
+            profiler.dump_stats(record['profile'])
+        if report:
+            # One write per line in append mode, so loader processes can share the file
+            with open(report, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+
+def read_report(path, run=None):
+    # Records of a report file, optionally only those of one run
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if run is None or r['run'] == run]
+
+def format_report(records):
+    # Plain-text table of stage records
+    lines = [f"{'stage':<22}{'wall s':>9}{'cpu s':>9}{'peak MB':>10}{'rows in':>12}{'rows out':>12}"]
+    for r in records:
+        cells = [r['wall_s'], r['cpu_s'], r['peak_rss_mb'], r['rows_in'], r['rows_out']]
+        cells = ['-' if c is None else f'{c:,}' if isinstance(c, int) else f'{c:.2f}' if isinstance(c, float) else str(c) for c in cells]
+        lines.append(f"{r['stage']:<22}{cells[0]:>9}{cells[1]:>9}{cells[2]:>10}{cells[3]:>12}{cells[4]:>12}")
+    return '\n'.join(lines)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Static SVG charts from data.json: one file per region and mode with the
+triangle, its grid, the region's trail and its latest point, in the layout of
+EXAMPLE Ternary Chart/export_svg.py. Records are grouped per region and mode in
+a single pass over the data and the files are rendered in a process pool.
+Run it through `python -m ternary svg`.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+import numpy as np
+
+from packed_data import shard_name
+from ternary_geometry import CORNERS, CORNER_CATS, chart_frame, mode_xy, to_chart, trail_geometry
+
+WIDTH = 1000
+HEIGHT = 900
+MARGIN = 50
+GRID_STEPS = 10 # Grid lines every 10%
+LABEL_STYLE = 'font-family="sans-serif" font-size="18" fill="#555"'
+# Corner labels (bio, elec, foss) as in the web app's tooltips
+CORNER_LABELS = {'final': ('Bio and other', 'Electricity', 'Fossil Fuels'),
+                 'useful': ('Bio and other', 'Electricity', 'Fossil Fuels'),
+                 'power': ('Other (Hydro/Bio/Nuc)', 'Wind & Solar', 'Fossil Fuels')}
+MODE_TITLES = {'final': 'Final energy', 'useful': 'Useful energy', 'power': 'Electricity generation'}
+
+def mode_series(data, regions, modes=CORNER_CATS):
+    """
+    {(region, mode): (years, pcts)} from data.json records in one pass, pcts
+    (years x 3) in CORNER_CATS order. Only years with a record (a source) count.
+    """
+    series = {}
+    for region in regions:
+        for year, entries in sorted(data.get(region, {}).items(), key=lambda item: int(item[0])):
+            for mode in modes:
+                entry = entries.get(mode)
+                if not entry or not entry.get('source'): continue
+                years, pcts = series.setdefault((region, mode), ([], []))
+                years.append(int(year))
+                pcts.append([entry.get(c + '_pct', np.nan) for c in CORNER_CATS[mode]])
+    return {key: (np.array(years), np.array(pcts, dtype=float)) for key, (years, pcts) in series.items()}
+
+def path_data(points):
+    # 'M x y L x y ...' for chart points (n x 2)
+    coords = [f'{x:.2f} {y:.2f}' for x, y in points]
+    return 'M ' + ' L '.join(coords) if coords else ''
+
+def triangle_corners(frame):
+    # Chart coordinates of the bio, elec and foss corners
+    return to_chart([CORNERS['bio'], CORNERS['elec'], CORNERS['foss']], frame)
+
+def grid_lines(corners):
+    # (p, q) end points of the grid lines: constant share of each corner, between the two edges that reach it
+    lines = []
+    for i in range(1, GRID_STEPS):
+        t = i / GRID_STEPS
+        for a, b, c in ((0, 1, 2), (1, 2, 0), (2, 0, 1)):
+            lines.append((corners[a] * t + corners[b] * (1 - t), corners[a] * t + corners[c] * (1 - t)))
+    return lines
+
+def triangle_svg(mode, frame):
+    # Outline, 10% grid and corner labels
+    corners = triangle_corners(frame)
+    parts = [f'<line x1="{p[0]:.2f}" y1="{p[1]:.2f}" x2="{q[0]:.2f}" y2="{q[1]:.2f}" stroke="#eee" stroke-width="1"/>'
+             for p, q in grid_lines(corners)]
+    parts.append(f'<path d="{path_data(corners)} Z" fill="none" stroke="#ccc" stroke-width="2" stroke-linejoin="round"/>')
+    bio, elec, foss = map(escape, CORNER_LABELS[mode])
+    parts += [f'<text x="{corners[0][0]:.2f}" y="{corners[0][1] - 12:.2f}" text-anchor="start" {LABEL_STYLE}>{bio}</text>',
+              f'<text x="{corners[1][0]:.2f}" y="{corners[1][1] - 12:.2f}" text-anchor="end" {LABEL_STYLE}>{elec}</text>',
+              f'<text x="{corners[2][0]:.2f}" y="{corners[2][1] + 28:.2f}" text-anchor="middle" {LABEL_STYLE}>{foss}</text>']
+    return parts
+
+def render_svg(region, mode, years, pcts, color, width=WIDTH, height=HEIGHT, margin=MARGIN):
+    # SVG text of one region's chart for one mode
+    frame = chart_frame(width, height, margin)
+    xy = mode_xy(pcts, list(CORNER_CATS[mode]), mode)
+    trail, _, _, trail_start = trail_geometry(years, xy, np.ones(len(years), dtype=bool), mode)
+    points, shown = to_chart(trail[trail_start:], frame), years[trail_start:]
+    span = f' {shown[0]}-{shown[-1]}' if len(shown) else ''
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+             f'<title>{escape(region)}: {MODE_TITLES[mode]}{span}</title>']
+    parts += triangle_svg(mode, frame)
+    if len(points) > 1:
+        parts.append(f'<path d="{path_data(points)}" fill="none" stroke="{color}" stroke-width="4" stroke-opacity="0.8" '
+                     'stroke-linecap="round" stroke-linejoin="round"/>')
+    if len(points):
+        x, y = points[-1]
+        parts.append(f'<circle cx="{x:.2f}" cy="{y:.2f}" r="8" fill="{color}" stroke="#fff" stroke-width="3"/>')
+        parts.append(f'<text x="{x + 12:.2f}" y="{y - 12:.2f}" {LABEL_STYLE}>{escape(region)} {shown[-1]}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts) + '\n'
+
+def svg_path(out_dir, region, mode):
+    # <out_dir>/<mode>/<region slug>.svg, the slug as for the data shards
+    return os.path.join(out_dir, mode, os.path.splitext(shard_name(region))[0] + '.svg')
+
+def write_svg(task):
+    path, region, mode, years, pcts, color = task
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render_svg(region, mode, years, pcts, color))
+    return path
+
+def export_svgs(data_path, out_dir, region_colors, modes=CORNER_CATS, jobs=1):
+    """
+    Write the chart of every region in region_colors ({region: color}) and mode
+    with data into out_dir, in jobs processes. Returns the paths written.
+    """
+    with open(data_path, encoding='utf-8') as f:
+        data = json.load(f)
+    series = mode_series(data, region_colors, modes)
+    for mode in modes:
+        os.makedirs(os.path.join(out_dir, mode), exist_ok=True)
+    tasks = [(svg_path(out_dir, region, mode), region, mode, years, pcts, region_colors[region])
+             for (region, mode), (years, pcts) in series.items()]
+    if jobs <= 1:
+        return [write_svg(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(write_svg, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
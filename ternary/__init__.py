@@ -0,0 +1,4 @@
+"""
+Command line interface of the chart pipeline (generate_all_charts).
+python -m ternary build --data-dir DIR --out-dir DIR [--regions ...] [--only power] ...
+"""
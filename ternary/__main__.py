@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+python -m ternary build: run the chart pipeline with paths and selections from
+the command line instead of the constants at the top of generate_all_charts.
+Input files default to their usual names in --data-dir, outputs go to --out-dir.
+--only limits the modes (and so the inputs read: --only power never touches
+WORLDBAL or IIASA), --outputs the files written.
+python -m ternary svg: static SVG charts of every region and mode from data.json.
+python -m ternary frames: PNG frames of the year-by-year playback, for animations.
+python -m ternary lod: simplified trails for a data.json-shaped file the app reads
+directly (the UK version's uk_global_merged.json), written next to it as .lod.json.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import frame_render
+import generate_all_charts as g
+import svg_export
+from ternary_geometry import LOD_TOLERANCES, records_lod
+
+def input_paths(args):
+    # {setting: path}: the usual file names in --data-dir, unless given one by one
+    paths = {}
+    for setting, option in (('IIASA_FILE', 'iiasa'), ('IEA_FILE', 'iea'), ('EMBER_FILE', 'ember'),
+                            ('NEW_EMBER_FILE', 'ember_history')):
+        default = getattr(g, setting)
+        if args.data_dir: default = os.path.join(args.data_dir, os.path.basename(default))
+        paths[setting] = getattr(args, option) or default
+    return paths
+
+def output_paths(args):
+    html, data = g.OUTPUT_HTML, g.OUTPUT_JSON
+    if args.out_dir:
+        html = os.path.join(args.out_dir, os.path.basename(html))
+        data = os.path.join(args.out_dir, os.path.basename(data))
+    return {'OUTPUT_HTML': args.html or html, 'OUTPUT_JSON': args.json or data}
+
+def region_names(selection):
+    # Display names from names or short codes (e.g. 'USA', 'Europe')
+    if not selection: return None
+    by_short = {config['short']: name for name, config in g.REGION_CONFIG.items()}
+    names = []
+    for item in selection:
+        name = item if item in g.REGION_CONFIG else by_short.get(item)
+        if name is None:
+            raise SystemExit(f"Unknown region {item!r}; use a REGION_CONFIG name or short code")
+        names.append(name)
+    return names
+
+def required_inputs(modes):
+    # Settings of the input files the modes read
+    files = {'IEA': 'IEA_FILE', 'IIASA': 'IIASA_FILE', 'Ember': 'EMBER_FILE', 'Ember (History)': 'NEW_EMBER_FILE'}
+    return sorted({files[source] for mode in modes or g.MODE_CATS for source in g.MODE_SOURCES[mode]})
+
+def build(args):
+    settings = dict(input_paths(args), **output_paths(args))
+    missing = [settings[s] for s in required_inputs(args.only) if not os.path.exists(settings[s])]
+    if missing: raise SystemExit("Missing input files: " + ', '.join(missing))
+    out_dir = os.path.dirname(settings['OUTPUT_HTML'])
+    for path in (settings['OUTPUT_HTML'], settings['OUTPUT_JSON']):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    default_cache = os.path.join(args.out_dir, 'cache') if args.out_dir else g.CACHE_DIR
+    settings['CACHE_DIR'] = None if args.no_cache else args.cache_dir or default_cache
+    settings['STAGE_REPORT'] = None if args.no_report else args.report or os.path.join(out_dir, 'stage_report.jsonl')
+    settings['PROFILE_DIR'] = os.path.join(out_dir, 'profile') if args.profile == '' else args.profile
+    settings['IEA_EXTRACT'] = args.iea_extract
+    settings['TRAIL_LOD'] = not args.no_trail_lod
+    settings['HASHED_DATA_KEEP'] = args.keep_data
+    for setting, value in settings.items():
+        setattr(g, setting, value)
+
+    g.main(jobs=args.jobs, html_data=args.html_data, incremental=not args.full,
+           regions=region_names(args.regions), year_span=args.years, modes=args.only, outputs=args.outputs)
+    return 0
+
+def svg(args):
+    data = args.data or g.OUTPUT_JSON
+    out_dir = args.out_dir or os.path.join(os.path.dirname(data), 'svg')
+    regions = region_names(args.regions) or list(g.REGION_CONFIG)
+    paths = svg_export.export_svgs(data, out_dir, {r: g.REGION_CONFIG[r]['color'] for r in regions},
+                                   modes=args.only or list(g.MODE_CATS), jobs=args.jobs)
+    print(f"Saved {len(paths)} charts to {out_dir}")
+    return 0
+
+def frames(args):
+    data = args.data or g.OUTPUT_JSON
+    out_dir = args.out_dir or os.path.join(os.path.dirname(data), 'frames')
+    regions = region_names(args.regions) or frame_render.DEFAULT_REGIONS
+    written = frame_render.render_frames(data, out_dir, {r: g.REGION_CONFIG[r]['color'] for r in regions},
+                                         modes=args.only or list(g.MODE_CATS), year_span=args.years,
+                                         smoothed=args.smooth, jobs=args.jobs, encode=args.encode)
+    print(f"Saved {sum(map(len, written.values()))} frames to {out_dir}")
+    return 0
+
+def lod(args):
+    with open(args.input, encoding='utf-8') as f:
+        data = json.load(f)
+    out = args.out or os.path.splitext(args.input)[0] + '.lod.json'
+    with open(out, 'w') as f:
+        json.dump(records_lod(data, args.tolerances), f)
+    print(f"Saved simplified trails of {len(data)} regions to {out}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m ternary', description='Ternary energy chart pipeline.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('build', help='generate the chart data and HTML from IIASA, IEA and Ember')
+
+    inputs = p.add_argument_group('inputs')
+    inputs.add_argument('--data-dir', help='directory with the input files under their usual names')
+    inputs.add_argument('--iiasa', help=f'IIASA CSV (default {os.path.basename(g.IIASA_FILE)})')
+    inputs.add_argument('--iea', help=f'IEA WORLDBAL dump (default {os.path.basename(g.IEA_FILE)})')
+    inputs.add_argument('--ember', help=f'Ember workbook (default {os.path.basename(g.EMBER_FILE)})')
+    inputs.add_argument('--ember-history', help=f'extended Ember history CSV (default {os.path.basename(g.NEW_EMBER_FILE)})')
+
+    outputs = p.add_argument_group('outputs')
+    outputs.add_argument('--out-dir', help='directory for the outputs (and, by default, the cache and stage report)')
+    outputs.add_argument('--html', help=f'HTML file (default {os.path.basename(g.OUTPUT_HTML)})')
+    outputs.add_argument('--json', help=f'data file; the packed data and shards go next to it (default {os.path.basename(g.OUTPUT_JSON)})')
+    outputs.add_argument('--outputs', nargs='+', choices=g.OUTPUTS, default=g.OUTPUTS, help='files to write (default: all)')
+    outputs.add_argument('--no-trail-lod', action='store_true',
+                         help='leave the simplified (level-of-detail) trails out of the packed data and shards')
+    outputs.add_argument('--html-data', choices=['embedded', 'external'], default=g.HTML_DATA,
+                         help='inline the data in the HTML (works offline) or load it from a content-hashed data.<hash>.json')
+    outputs.add_argument('--keep-data', type=int, default=g.HASHED_DATA_KEEP, metavar='N',
+                         help=f'older data.<hash>.json files kept for pages cached from earlier builds (default {g.HASHED_DATA_KEEP})')
+
+    selection = p.add_argument_group('selection')
+    selection.add_argument('--regions', nargs='+', metavar='REGION', help='display regions by name or short code (default: all)')
+    selection.add_argument('--years', nargs=2, type=int, metavar=('FIRST', 'LAST'), help='only output these years')
+    selection.add_argument('--only', nargs='+', choices=list(g.MODE_CATS), metavar='MODE',
+                           help='only build these modes (final, useful, power) and read only their inputs; '
+                                'such runs recompute their regions and leave the incremental state alone')
+
+    run = p.add_argument_group('run')
+    run.add_argument('--jobs', type=int, default=g.DEFAULT_JOBS,
+                     help=f'processes used to load the input files and scan WORLDBAL in parallel (1 = sequential, default {g.DEFAULT_JOBS})')
+    run.add_argument('--cache-dir', help='parsed inputs and per-region state (default: cache/ in --out-dir)')
+    run.add_argument('--no-cache', action='store_true', help='always reparse the inputs and recompute every region')
+    run.add_argument('--iea-extract', action='store_true',
+                     help='read WORLDBAL through a small filtered extract kept in the cache dir (written on first use)')
+    run.add_argument('--full', action='store_true',
+                     help='recompute every region instead of only those whose inputs changed since the last run')
+    run.add_argument('--report', help='JSON-lines file the per-stage metrics are appended to (default: stage_report.jsonl next to the HTML)')
+    run.add_argument('--no-report', action='store_true', help='do not write the stage report')
+    run.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                     help='also run every stage under cProfile and write one <stage>.<run>.<pid>.<n>.prof file per stage to DIR (default: profile/ next to the HTML)')
+    p.set_defaults(run=build)
+
+    p = commands.add_parser('svg', help='static SVG chart of every region and mode from data.json')
+    p.add_argument('--data', help=f'merged data (default {os.path.basename(g.OUTPUT_JSON)} from the build)')
+    p.add_argument('--out-dir', help='directory for <mode>/<region>.svg (default: svg/ next to the data)')
+    p.add_argument('--regions', nargs='+', metavar='REGION', help='display regions by name or short code (default: all)')
+    p.add_argument('--only', nargs='+', choices=list(g.MODE_CATS), metavar='MODE', help='only these modes (final, useful, power)')
+    p.add_argument('--jobs', type=int, default=g.DEFAULT_JOBS, help=f'processes rendering the charts (default {g.DEFAULT_JOBS})')
+    p.set_defaults(run=svg)
+
+    p = commands.add_parser('frames', help='PNG frames of the year-by-year playback (needs Pillow)')
+    p.add_argument('--data', help=f'merged data (default {os.path.basename(g.OUTPUT_JSON)} from the build)')
+    p.add_argument('--out-dir', help='directory for <mode>/<year>.png (default: frames/ next to the data)')
+    p.add_argument('--regions', nargs='+', metavar='REGION', help="display regions by name or short code (default: the web app's initial selection)")
+    p.add_argument('--only', nargs='+', choices=list(g.MODE_CATS), metavar='MODE', help='only these modes (final, useful, power)')
+    p.add_argument('--years', nargs=2, type=int, metavar=('FIRST', 'LAST'), help='frame years (default: the slider range up to the last record)')
+    p.add_argument('--smooth', action='store_true', help='draw the smoothed trails')
+    p.add_argument('--jobs', type=int, default=g.DEFAULT_JOBS, help=f'processes rendering frames (default {g.DEFAULT_JOBS})')
+    p.add_argument('--encode', metavar='COMMAND',
+                   help="also pipe each mode's frames into this command, {mode} filled in, e.g. "
+                        "'ffmpeg -y -f image2pipe -framerate 10 -c:v png -i - ternary-{mode}.mp4'")
+    p.set_defaults(run=frames)
+
+    p = commands.add_parser('lod', help='simplified trails for a data.json-shaped file (e.g. UK version/uk_global_merged.json)')
+    p.add_argument('input', help='data file: {region: {year: {mode: record}}}')
+    p.add_argument('--out', help='output file (default: <input>.lod.json)')
+    p.add_argument('--tolerances', type=float, nargs='+', default=LOD_TOLERANCES, metavar='TOL',
+                   help=f'simplification tolerances in triangle side lengths, finest first (default {LOD_TOLERANCES})')
+    p.set_defaults(run=lod)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.run is build and args.iea_extract and args.no_cache:
+        # The extract lives in the cache dir, so without one the full WORLDBAL scan would run anyway
+        parser.error('--iea-extract needs the cache dir and cannot be combined with --no-cache')
+    return args.run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Ternary chart geometry shared by the build, the web app and the exporters.
+A mix is drawn in the unit triangle with Bio at the top left (0, 0), Electrons at
+the top right (1, 0) and Fossil at the bottom (0.5, sqrt(3)/2), y growing downwards
+as in SVG; a chart scales the points by its triangle's side length.
+A trail is the points of the years with a record, in order, so the trail up to a
+year is a prefix of it: trail_end gives its length for every year.
+Long trails can also be simplified (Ramer-Douglas-Peucker) at a few tolerances,
+given in unit-triangle lengths; a level is the sorted indices of the trail points
+it keeps. Drawing the prefix up to a year from a level takes its points before
+the year plus every full-trail point after the last of them, so the drawn line
+never strays further than the tolerance from the full one.
+"""
+
+import numpy as np
+
+TRIANGLE_HEIGHT = np.sqrt(3) / 2
+CORNERS = {'bio': (0.0, 0.0), 'elec': (1.0, 0.0), 'foss': (0.5, TRIANGLE_HEIGHT)}
+# Category at the (bio, elec, foss) corners per mode
+CORNER_CATS = {'final': ('bio', 'electrons', 'fossil'), 'useful': ('bio', 'electrons', 'fossil'),
+               'power': ('other', 'wind_solar', 'fossil')}
+SMOOTH_WINDOW = 5 # The smoothed trail averages each point with up to 4 before it
+POWER_TRAIL_START = 1985 # Power trails are drawn from here; earlier points only feed the smoothing
+LOD_TOLERANCES = [0.001, 0.002, 0.005] # Trail simplification levels, finest first (0.001 ~ 0.6px on the 640px chart)
+
+def unit_xy(bio, elec, foss):
+    # Shares (fractions summing to 1) -> unit triangle (x, y), same arithmetic as ternToXY in app.js
+    x = bio * CORNERS['bio'][0] + elec * CORNERS['elec'][0] + foss * CORNERS['foss'][0]
+    y = bio * CORNERS['bio'][1] + elec * CORNERS['elec'][1] + foss * CORNERS['foss'][1]
+    return x, y
+
+def chart_frame(width, height, margin):
+    # (left, top, side) of the largest triangle centred in the chart, Bio corner at (left, top)
+    side = min(width - 2 * margin, height - 2 * margin)
+    return width / 2 - side / 2, margin, side
+
+def to_chart(xy, frame):
+    # Unit triangle points (..., 2) -> chart coordinates in a chart_frame()
+    left, top, side = frame
+    return np.asarray(xy) * side + (left, top)
+
+def mode_xy(pcts, cats, mode):
+    # Points (..., 2) from percentage columns named by cats; missing percentages count as 0 like in the web app
+    shares = [np.nan_to_num(pcts[..., cats.index(c)]) / 100 for c in CORNER_CATS[mode]]
+    return np.stack(unit_xy(*shares), axis=-1)
+
+def smooth_trail(points, window=SMOOTH_WINDOW):
+    # Trailing mean of every point with up to window - 1 points before it
+    sums = np.concatenate([np.zeros((1, 2)), np.cumsum(points, axis=0)])
+    end = np.arange(1, len(points) + 1)
+    start = np.maximum(end - window, 0)
+    return (sums[end] - sums[start]) / (end - start)[:, None]
+
+def trail_geometry(years, xy, present, mode):
+    """
+    Trail of one region's series over `years`: (trail, smoothed trail, trail_end,
+    trail_start). trail holds the points of the years with a record; the trail drawn
+    up to year i is trail[trail_start:trail_end[i]] (or the smoothed one).
+    """
+    years = np.asarray(years)
+    trail = xy[present]
+    trail_end = np.cumsum(present)
+    trail_start = int((years[present] < POWER_TRAIL_START).sum()) if mode == 'power' else 0
+    return trail, smooth_trail(trail), trail_end, trail_start
+
+def simplify(points, tolerance):
+    # Ramer-Douglas-Peucker: sorted indices of the points to keep (always the first
+    # and last) so that every dropped point is within tolerance of the kept polyline
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n: keep[[0, -1]] = True
+    stack = [(0, n - 1)] if n > 2 else []
+    while stack:
+        first, last = stack.pop()
+        a, d = points[first], points[last] - points[first]
+        inner = points[first + 1:last]
+        # Distance to the segment (not the line: trails can double back)
+        length2 = d @ d
+        t = np.clip((inner - a) @ d / length2, 0, 1) if length2 else np.zeros(len(inner))
+        dist = np.hypot(*(inner - a - t[:, None] * d).T)
+        i = int(dist.argmax())
+        if dist[i] > tolerance:
+            mid = first + 1 + i
+            keep[mid] = True
+            if mid - first > 1: stack.append((first, mid))
+            if last - mid > 1: stack.append((mid, last))
+    return np.flatnonzero(keep)
+
+def trail_lod(trail, trail_start, tolerances=LOD_TOLERANCES):
+    # Kept trail indices per tolerance, for the drawn part of the trail (from trail_start)
+    return [simplify(trail[trail_start:], tol) + trail_start for tol in tolerances]
+
+def records_lod(data, tolerances=LOD_TOLERANCES):
+    """
+    Simplified trails for data.json-shaped records {region: {year: {mode: entry}}},
+    for apps that draw straight from such a file (e.g. the UK version):
+    {'tolerances': [...], 'regions': {region: {mode: {'trail': [[year, ...] per
+    level], 'smooth': [...]}}}}, the kept points given by their years.
+    """
+    lod = {'tolerances': list(tolerances), 'regions': {}}
+    for region, records in data.items():
+        years = sorted(records, key=int)
+        lod['regions'][region] = {}
+        for mode, cats in CORNER_CATS.items():
+            entries = [(int(y), records[y][mode]) for y in years if records[y].get(mode, {}).get('source')]
+            if not entries: continue
+            trail_years = np.array([y for y, _ in entries])
+            pcts = np.array([[entry.get(c + '_pct', np.nan) for c in cats] for _, entry in entries], dtype=float)
+            present = np.ones(len(entries), dtype=bool)
+            trail, smooth, _, trail_start = trail_geometry(trail_years, mode_xy(pcts, list(cats), mode), present, mode)
+            lod['regions'][region][mode] = {
+                'trail': [trail_years[idx].tolist() for idx in trail_lod(trail, trail_start, tolerances)],
+                'smooth': [trail_years[idx].tolist() for idx in trail_lod(smooth, trail_start, tolerances)],
+            }
+    return lod
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Long-format ("tidy") table of the merged data for analysis: one row per region,
+year, mode and category (the mode's categories plus 'total') with its value,
+percentage (empty for the total) and source. It holds the same records as
+data.json, so notebooks can load it directly instead of walking the nested JSON.
+The table is built from the output column arrays in one vectorised step and
+written with pandas' CSV writer and, with pyarrow, as Parquet and Feather.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow # Parquet and Feather
+except ImportError:
+    pyarrow = None
+
+TIDY_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+def tidy_paths(json_path, formats=TIDY_FORMATS):
+    # data.json -> {format: data.long.<ext>}
+    base = os.path.splitext(json_path)[0] + '.long'
+    return {fmt: base + TIDY_FORMATS[fmt] for fmt in formats}
+
+def tidy_table(regions, years, columns, mode_cats, origins):
+    """
+    DataFrame (region, year, mode, category, value, pct, source) from per-mode
+    output columns {mode: (values, pcts, present, origin)} as from merged_columns(),
+    ordered by region, year, mode and category, the categories in their mode's
+    order with 'total' last (as in data.json). Only records (present) become rows.
+    region, mode, category and source are categoricals.
+    """
+    years = np.asarray(years)
+    categories = list(dict.fromkeys(c for cats in mode_cats.values() for c in cats + ['total']))
+    parts = []
+    for mi, (mode, cats) in enumerate(mode_cats.items()):
+        values, pcts, present, origin = columns[mode]
+        ri, yi = np.nonzero(present)
+        n_cats = len(cats) + 1
+        pct = np.concatenate([pcts[ri, yi], np.full((len(ri), 1), np.nan)], axis=1) # No percentage for the total
+        parts.append({
+            'region': np.repeat(ri, n_cats), 'year': np.repeat(years[yi], n_cats),
+            'mode': np.full(len(ri) * n_cats, mi),
+            'category': np.tile([categories.index(c) for c in cats + ['total']], len(ri)),
+            'rank': np.tile(np.arange(n_cats), len(ri)), # Position in the mode's categories, for the order
+            'value': values[ri, yi].ravel(), 'pct': pct.ravel(),
+            'source': np.repeat(origin[ri, yi], n_cats),
+        })
+    col = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    order = np.lexsort((col['rank'], col['mode'], col['year'], col['region']))
+    return pd.DataFrame({
+        'region': pd.Categorical.from_codes(col['region'][order], categories=list(regions)),
+        'year': col['year'][order].astype(np.int16),
+        'mode': pd.Categorical.from_codes(col['mode'][order], categories=list(mode_cats)),
+        'category': pd.Categorical.from_codes(col['category'][order], categories=categories),
+        'value': col['value'][order],
+        'pct': col['pct'][order],
+        'source': pd.Categorical.from_codes(col['source'][order], categories=list(origins)),
+    })
+
+def write_tidy(json_path, table, formats=TIDY_FORMATS):
+    """
+    Write the table next to json_path in each format (csv, parquet, feather).
+    Returns {format: path}; Parquet and Feather are skipped without pyarrow.
+    """
+    written = {}
+    for fmt, path in tidy_paths(json_path, formats).items():
+        if fmt != 'csv' and pyarrow is None:
+            print(f"Skipping {path}: writing {fmt} needs pyarrow")
+            continue
+        if fmt == 'csv': table.to_csv(path, index=False)
+        elif fmt == 'parquet': table.to_parquet(path, index=False)
+        else: table.to_feather(path)
+        written[fmt] = path
+    return written
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Reader for the IEA WORLDBAL fixed-width dump.
+Every line holds six 30-character columns: country, product, year, flow, unit, value.
+Rows are filtered column-wise with NumPy on the raw bytes, so only the few matching
+lines are decoded. The dump is sorted by country, so an index of each country's byte
+block lets a reader skip everything it does not need.
+"""
+
+import os
+
+import numpy as np
+
+# Fixed-width layout (same columns as parse_iea_line)
+IEA_FIELD_WIDTH = 30
+IEA_COUNTRY_COL, IEA_PRODUCT_COL, IEA_FLOW_COL, IEA_UNIT_COL = 0, 30, 90, 120
+IEA_MIN_LINE = 151 # Shorter lines have no value column left after strip()
+IEA_CHUNK_BYTES = 64 * 1024 * 1024
+
+def parse_iea_line(line):
+    if len(line) < 150: return None
+    country = line[0:30].strip()
+    product = line[30:60].strip()
+    year = line[60:90].strip()
+    flow = line[90:120].strip()
+    unit = line[120:150].strip()
+    value_str = line[150:180].strip()
+    if '..' in value_str or not value_str or 'x' in value_str: return None
+    try:
+        year = int(year)
+        value = float(value_str)
+    except (ValueError, TypeError): return None
+    return {'country': country, 'product': product, 'year': year, 'flow': flow, 'unit': unit, 'value': value}
+
+def format_iea_line(record):
+    # Inverse of parse_iea_line (repr() round-trips the float exactly)
+    fields = [record['country'], record['product'], str(record['year']), record['flow'], record['unit']]
+    return ''.join(f.ljust(IEA_FIELD_WIDTH) for f in fields) + repr(record['value'])
+
+def _iea_padded(values):
+    # Fixed-width field as it appears in the file, e.g. 'TFC' -> b'TFC' + 27 spaces
+    return np.array([v.ljust(IEA_FIELD_WIDTH).encode('latin-1') for v in values], dtype=f'S{IEA_FIELD_WIDTH}')
+
+def _iea_column(buf, starts, offset):
+    # Gather one 30-byte column for every line start as an S30 array
+    idx = starts[:, None] + (offset + np.arange(IEA_FIELD_WIDTH))
+    return np.ascontiguousarray(buf[idx]).view(f'S{IEA_FIELD_WIDTH}').ravel()
+
+def _read_lines(filepath, start, end):
+    """
+    Yield (data, buf, cut, starts, lengths, offset) per chunk of the byte range
+    [start, end), which must sit on line boundaries (end=None reads to EOF).
+    buf covers data[:cut], the complete lines of the chunk; starts are their offsets
+    in data, lengths exclude the newline, and offset is the file position of data.
+    """
+    tail = b''
+    offset = start
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        remaining = end - start if end is not None else None
+        while True:
+            size = IEA_CHUNK_BYTES if remaining is None else min(IEA_CHUNK_BYTES, remaining)
+            block = f.read(size)
+            if remaining is not None: remaining -= len(block)
+            data = tail + block
+            if not data: break
+            # Keep the trailing partial line for the next chunk (unless at the end)
+            cut = data.rfind(b'\n') + 1 if block else len(data)
+            if cut == 0:
+                tail = data
+                continue
+            tail = data[cut:]
+
+            buf = np.frombuffer(data, dtype=np.uint8, count=cut)
+            ends = np.flatnonzero(buf == ord('\n'))
+            if not block and (len(ends) == 0 or ends[-1] != cut - 1):
+                ends = np.append(ends, cut) # Last line without newline
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            lengths = ends - starts
+            has_cr = buf[np.maximum(ends - 1, 0)] == ord('\r')
+            lengths = lengths - (has_cr & (lengths > 0))
+            yield data, buf, cut, starts, lengths, offset
+            offset += cut
+
+def _scan_iea_chunks(filepath, start, end, countries, products, flow, unit):
+    # Yield (lines_seen, records) per chunk of the byte range [start, end)
+    for data, buf, cut, starts, lengths, _ in _read_lines(filepath, start, end):
+        # Cheapest filters first, narrowing the candidate lines each time
+        rows = starts[lengths >= IEA_MIN_LINE]
+        rows = rows[_iea_column(buf, rows, IEA_FLOW_COL) == flow]
+        rows = rows[_iea_column(buf, rows, IEA_UNIT_COL) == unit]
+        rows = rows[np.isin(_iea_column(buf, rows, IEA_PRODUCT_COL), products)]
+        rows = rows[np.isin(_iea_column(buf, rows, IEA_COUNTRY_COL), countries)]
+
+        # Only the surviving rows are decoded and parsed
+        records = []
+        for row_start in rows.tolist():
+            row_end = data.find(b'\n', row_start, cut)
+            line = data[row_start:row_end if row_end != -1 else cut].decode('latin-1')
+            parsed = parse_iea_line(line.rstrip('\r'))
+            if parsed: records.append(parsed)
+        yield len(starts), records
+
+def scan_iea_range(filepath, start, end, countries, products, flow, unit):
+    # Worker entry point: (lines_seen, records) for a whole byte range
+    line_count, records = 0, []
+    for lines, chunk_records in _scan_iea_chunks(filepath, start, end, countries, products, flow, unit):
+        line_count += lines
+        records.extend(chunk_records)
+    return line_count, records
+
+def iea_byte_ranges(filepath, part_bytes=IEA_CHUNK_BYTES):
+    # Split the file into consecutive (start, end) ranges of about part_bytes, each
+    # ending just after a newline so no line straddles two ranges
+    size = os.path.getsize(filepath)
+    bounds = [0]
+    with open(filepath, 'rb') as f:
+        while bounds[-1] + part_bytes < size:
+            f.seek(bounds[-1] + part_bytes - 1)
+            f.readline()
+            if f.tell() >= size: break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def scan_iea_file(filepath, countries, products, flow='TFC', unit='KTOE', executor=None, ranges=None, counts=None):
+    """
+    Yield parse_iea_line() records for the rows matching countries/products/flow/unit.
+    The file is read in large binary chunks and filtered column-wise with NumPy, so
+    only the matching rows are ever decoded into Python objects.
+    ranges limits the scan to those (start, end) byte ranges, in order (see
+    country_ranges()). With an executor, the ranges (by default line-aligned slices
+    of the whole file) are scanned in its workers; records still come back in file
+    order, so sums built from them match a serial scan.
+    counts (a dict), if given, gets the number of 'lines' seen and 'records' yielded.
+    """
+    countries = _iea_padded(sorted(countries))
+    products = _iea_padded(sorted(products))
+    flow, unit = _iea_padded([flow])[0], _iea_padded([unit])[0]
+
+    if executor is not None:
+        if ranges is None: ranges = iea_byte_ranges(filepath)
+        futures = [executor.submit(scan_iea_range, filepath, start, end, countries, products, flow, unit)
+                   for start, end in ranges]
+        parts = (future.result() for future in futures)
+    elif ranges is not None:
+        parts = (part for start, end in ranges
+                 for part in _scan_iea_chunks(filepath, start, end, countries, products, flow, unit))
+    else:
+        parts = _scan_iea_chunks(filepath, 0, None, countries, products, flow, unit)
+
+    line_count = record_count = 0
+    for lines, records in parts:
+        prev_count = line_count
+        line_count += lines
+        record_count += len(records)
+        for n in range((prev_count // 10000000 + 1) * 10000000, line_count + 1, 10000000):
+            print(f"  Processed {n:,} lines...")
+        if counts is not None: counts.update(lines=line_count, records=record_count)
+        yield from records
+    if counts is not None: counts.update(lines=line_count, records=record_count)
+
+def index_range(filepath, start, end):
+    # [country, block_start, block_end] runs of consecutive data lines in a byte range
+    runs = []
+    for _, buf, cut, starts, lengths, offset in _read_lines(filepath, start, end):
+        rows = np.flatnonzero(lengths >= IEA_MIN_LINE)
+        if not len(rows): continue
+        codes = _iea_column(buf, starts[rows], IEA_COUNTRY_COL)
+        # Each line ends where the next one starts (or at the end of the chunk)
+        line_ends = np.append(starts[1:], cut)[rows]
+        first = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        last = np.append(first[1:] - 1, len(rows) - 1)
+        for code, run_start, run_end in zip(codes[first].tolist(), starts[rows][first].tolist(), line_ends[last].tolist()):
+            runs.append([code.decode('latin-1').strip(), offset + run_start, offset + run_end])
+    return runs
+
+def build_country_index(filepath, executor=None):
+    """
+    Byte blocks of every country in the file: {country: [[start, end], ...]}.
+    The dump is sorted by country, so normally each country has a single block.
+    Only the country column is read; with an executor the file is indexed in
+    parallel byte ranges and the runs are stitched together afterwards.
+    """
+    print(f"Indexing {filepath}...")
+    ranges = iea_byte_ranges(filepath)
+    if executor is None:
+        parts = [index_range(filepath, start, end) for start, end in ranges]
+    else:
+        futures = [executor.submit(index_range, filepath, start, end) for start, end in ranges]
+        parts = [future.result() for future in futures]
+
+    index = {}
+    prev = None
+    for runs in parts:
+        for code, start, end in runs:
+            if prev and prev[0] == code:
+                prev[2] = end # Run continues across a range/chunk boundary
+                continue
+            prev = [code, start, end]
+            index.setdefault(code, []).append(prev)
+    return {code: [[start, end] for _, start, end in blocks] for code, blocks in index.items()}
+
+def country_ranges(index, countries):
+    # Byte ranges covering the given countries, in file order with touching blocks merged
+    blocks = sorted(block for code in countries for block in index.get(code, []))
+    ranges = []
+    for start, end in blocks:
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def write_extract(path, records):
+    # Write records as a WORLDBAL-format file that scans back to the same records
+    tmp_path = path + '.tmp'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(tmp_path, 'w', encoding='latin-1', newline='\n') as f:
+        for record in records:
+            f.write(format_iea_line(record) + '\n')
+    os.replace(tmp_path, path)